@@ -1,3 +1,6 @@
+from array import array
+
+
 class Automata:
     """Represents a finite automaton."""
 
@@ -17,10 +20,18 @@ class Automata:
         self.accepts = accepts
         """List of names of accepting states for the automata. These are strings."""
 
-        self.nodes = {name: AutomataNode(name) for name in states}
+        self.nodes = {}
         """Dictionary of nodes in the automata. The key is the state name, 
            the value is the node object."""
 
+        self.tables = None
+        """Cached NfaTables for this automata (see subset_construction)."""
+
+        self.dense = None
+        """Cached DenseAutomata form of this automata (see getDenseAutomata)."""
+
+        self.addNodes([AutomataNode(name) for name in states])
+
         self.alphabet = set(alphabet)
         """A set of symbols that comprise the alphabet for this automaton."""
 
@@ -49,6 +60,23 @@ class Automata:
         ret += "States: " + str([val.name for val in self.nodes.values()])
         return ret
 
+    def __setattr__(self, name, value):
+        # Replacing any attribute other than the caches themselves changes
+        # the automata, so the cached forms of it are dropped.
+        self.__dict__[name] = value
+        if name not in ('tables', 'dense'):
+            self.clearCaches()
+
+    def clearCaches(self):
+        """Drops the cached NfaTables and DenseAutomata forms of this
+           automata. This is done
+           whenever an attribute of the automata or of one of its nodes is
+           assigned, or a node or transition is added; code that changes the
+           accepts list, the alphabet or a transitions dictionary in place
+           must call this itself."""
+        self.tables = None
+        self.dense = None
+
     def getAllStates(self):
         return self.nodes
 
@@ -63,14 +91,141 @@ class Automata:
 
     def addNodes(self, nodes):
         """Adds supplied nodes (already constructed) to the automata. Expects a list."""
+        self.clearCaches()
         for node in nodes:
+            node.owner = self
             self.nodes[node.name] = node
 
+    def markAccepting(self, name, tag=None):
+        """Makes a state accepting, adding it to the accepts list, and gives
+           it a tag if one is supplied."""
+        node = self.nodes[name]
+        if not node.accept:
+            self.accepts.append(name)
+            node.accept = True
+        if tag is not None:
+            node.tag = tag
+        self.clearCaches()
+
+
+class DenseAutomata:
+    """A compact, array-backed representation of a DFA. States are numbered
+       from 0 and symbols are numbered by their column in the transition
+       table, so that a transition is a single index into a flat array."""
+
+    DEAD = -1
+    """Transition table entry for a missing transition, and the tag of a state
+       with no tag."""
+
+    def __init__(self, names, symbols, start, accepting, tags, table):
+        self.names = names
+        """List of state names, indexed by state number."""
+
+        self.symbols = symbols
+        """List of the symbols in the alphabet, indexed by column."""
+
+        self.symbolIndex = {symbol: i for i, symbol in enumerate(symbols)}
+        """Dictionary mapping each symbol to its column."""
+
+        self.start = start
+        """Number of the starting state."""
+
+        self.accepting = accepting
+        """array('b') of accept flags, indexed by state number."""
+
+        self.tags = tags
+        """array('i') of node tags (DEAD for none), indexed by state number."""
+
+        self.table = table
+        """array('i') transition table, one row of len(symbols) entries per
+           state. The state reached from state s on the symbol in column c is
+           table[s * len(symbols) + c], or DEAD if there is no transition."""
+
+    def __str__(self):
+        ret = "Dense Automaton:\n"
+        ret += "Start:  " + str(self.names[self.start]) + '\n'
+        ret += "Accept: " + str(self.acceptNames()) + '\n'
+        ret += "States: " + str(self.names)
+        return ret
+
+    @classmethod
+    def fromAutomata(cls, dfa):
+        """Builds the dense form of a DFA. The start state is always numbered 0,
+           and the remaining states keep the order of dfa.states."""
+        names = [dfa.start] + [name for name in dfa.states if name != dfa.start]
+        named = set(names)
+        names += [name for name in dfa.nodes if name not in named]
+        number = {name: i for i, name in enumerate(names)}
+        acceptSet = set(dfa.accepts)
+        symbols = sorted(dfa.alphabet)
+        width = len(symbols)
+
+        accepting = array('b', [0]) * len(names)
+        tags = array('i', [cls.DEAD]) * len(names)
+        table = array('i', [cls.DEAD]) * (len(names) * width)
+        symbolIndex = {symbol: i for i, symbol in enumerate(symbols)}
+
+        for name in names:
+            node, row = dfa.nodes[name], number[name] * width
+            accepting[number[name]] = node.accept or name in acceptSet
+            if node.tag is not None:
+                tags[number[name]] = node.tag
+            for symbol, states in node.transitions.items():
+                if len(states) != 1 or symbol not in symbolIndex:
+                    raise Exception("State " + str(name) + " is not " \
+                                    + "deterministic on symbol " + repr(symbol))
+                table[row + symbolIndex[symbol]] = number[states[0]]
+
+        return cls(names, symbols, 0, accepting, tags, table)
+
+    def toAutomata(self):
+        """Converts this DFA back into an equivalent Automata object, with the
+           original state names."""
+        width = len(self.symbols)
+        transitions = []
+        for state, name in enumerate(self.names):
+            for column, symbol in enumerate(self.symbols):
+                toState = self.table[state * width + column]
+                if toState != self.DEAD:
+                    transitions.append([name, [symbol], self.names[toState]])
+
+        dfa = Automata(list(self.names), self.names[self.start],
+                       self.acceptNames(), transitions, self.symbols)
+        for state, name in enumerate(self.names):
+            if self.tags[state] != self.DEAD:
+                dfa.nodes[name].tag = self.tags[state]
+        return dfa
+
+    def acceptNames(self):
+        return [self.names[i] for i in range(len(self.names)) if self.accepting[i]]
+
+    def nextState(self, state, symbol):
+        """Returns the state reached from state on symbol, or DEAD."""
+        column = self.symbolIndex.get(symbol)
+        if column is None:
+            return self.DEAD
+        return self.table[state * len(self.symbols) + column]
+
+
+def getDenseAutomata(dfa):
+    """Returns the DenseAutomata form of a DFA, converting it the first time it
+       is needed. The result is cached on the DFA until the DFA is changed
+       (see Automata.clearCaches)."""
+    if dfa.dense is None:
+        dfa.dense = DenseAutomata.fromAutomata(dfa)
+    return dfa.dense
+
+
+class AutomataNode(object):
+    __slots__ = ('owner', 'name', 'transitions', 'accept', 'tag')
+
+    def __init__(self, name, accept=False, tag=None):
+        self.owner = None
+        """The automata this node was last added to."""
 
-class AutomataNode:
-    def __init__(self, name, accept=False):
         self.name = name
-        """Name of this state. This should uniquely identify this state."""
+        """Name of this state. This should uniquely identify this state within
+           its automata; nodes themselves hash and compare by identity."""
 
         self.transitions = {}
         """Dictionary of symbol keys that returns lists of states."""
@@ -78,6 +233,10 @@ class AutomataNode:
         self.accept = accept
         """Indicates that this node is an accept state."""
 
+        self.tag = tag
+        """Priority of the lexical class this accept state recognizes (lower
+           wins), or None if the state is not tagged."""
+
     def __str__(self):
         return self.name
 
@@ -91,13 +250,13 @@ class AutomataNode:
 
         return ret
 
-    def __hash__(self):
-        # Hash based entirely off of state name, as names *should* be unique.
-        return hash(self.name)
-
-    def __eq__(self, other):
-        # Equality based entirely off of state name, as names *should* be unique.
-        return self.name == other.name
+    def __setattr__(self, name, value):
+        # Changing a node changes its automata, so the automata's cached forms
+        # are dropped. owner may not be set yet while a node is unpickled.
+        object.__setattr__(self, name, value)
+        owner = getattr(self, 'owner', None)
+        if name != 'owner' and owner is not None:
+            owner.clearCaches()
 
     def getTransitionState(self, input_string):
         """Returns the state traversed to on a given input symbol, or none if 
@@ -113,3 +272,5 @@ class AutomataNode:
             self.transitions[transSymbol].append(toState)
         else:
             self.transitions[transSymbol] = [toState]
+        if self.owner is not None:
+            self.owner.clearCaches()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""benchmarks.py: Timings for the slower parts of the toolchain. Run it
+   directly to print them."""
+
+import random
+import time
+from description_reader import buildAutomata, buildLexicalDescription, \
+    readDescription
+from thompsons_construction import convertRegexListToNFA
+from subset_construction import convertNfaToDfa
+from hopcrofts_algorithm import hopcroftMinimize
+
+
+def bestTime(function, repeat=3):
+    """Returns the fastest of repeat runs of function, in seconds."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def syntheticAutomata(stateCount, alphabet='abcdefghijklmnopqrstuvwxyz'):
+    """Returns the description of a random DFA with a transition from every
+       state on every symbol."""
+    random.seed(stateCount)
+    states = ['s' + str(i) for i in range(stateCount)]
+    lines = ['dfa', 'states'] + states + ['end;']
+    lines += ['initial', states[0]]
+    lines += ['accept'] + states[::7] + ['end;']
+    lines += ['transitions']
+    for state in states:
+        for symbol in alphabet:
+            lines.append(state + " '" + symbol + " --> " + random.choice(states))
+    lines += ['end;', 'alphabet', ' '.join("'" + s for s in alphabet), 'end;']
+    return '\n'.join(lines) + '\n'
+
+
+def compareParsers(name, build, contents):
+    """Prints how long both parsers take to build from a description."""
+    fast = bestTime(lambda: build(contents, 'fast'))
+    slow = bestTime(lambda: build(contents, 'pyparsing'))
+    print "%-36s pyparsing %8.4fs  fast %8.4fs  (%.1fx)" % \
+          (name, slow, fast, slow / fast)
+
+
+def benchmarkParsers():
+    compareParsers('tiny_basic_lex_desc.txt', buildLexicalDescription,
+                   readDescription('testdata/tiny_basic_lex_desc.txt'))
+    compareParsers('lexdesc2.txt', buildLexicalDescription,
+                   readDescription('testdata/lexdesc2.txt'))
+    compareParsers('dfa1.txt', buildAutomata,
+                   readDescription('testdata/dfa1.txt'))
+    compareParsers('200 state dfa (5200 transitions)', buildAutomata,
+                   syntheticAutomata(200))
+    compareParsers('2000 state dfa (52000 transitions)', buildAutomata,
+                   syntheticAutomata(2000))
+
+
+def compareConstructions(name, regexes):
+    """Prints how long building a scanner DFA from regexes takes through
+       Thompson's and through Glushkov's construction, and the NFA sizes."""
+    results = []
+    for method in ['thompson', 'glushkov']:
+        nfa = convertRegexListToNFA(regexes, method)
+        edges = len(nfa.transitions)
+        construct = bestTime(lambda: convertRegexListToNFA(regexes, method))
+        determinize = bestTime(lambda: convertNfaToDfa(
+            convertRegexListToNFA(regexes, method))) - construct
+        minimize = bestTime(lambda: hopcroftMinimize(convertNfaToDfa(
+            convertRegexListToNFA(regexes, method))))
+        results.append("%s %5d states %5d edges, nfa %.4fs dfa %.4fs" \
+                       " total %.4fs" % (method[0], len(nfa.nodes), edges,
+                                         construct, max(determinize, 0),
+                                         minimize))
+    print "%-24s %s" % (name, results[0])
+    print "%-24s %s" % ('', results[1])
+
+
+def benchmarkConstructions():
+    for name in ['lexdesc1.txt', 'lexdesc2.txt', 'lexdesc3.txt',
+                 'lexdesc4.txt', 'tiny_basic_lex_desc.txt']:
+        lexDesc = buildLexicalDescription(readDescription('testdata/' + name))
+        compareConstructions(name, [c.regex for c in lexDesc.classes])
+
+    # Every class of the TinyBASIC description, 20 times over.
+    lexDesc = buildLexicalDescription(
+        readDescription('testdata/tiny_basic_lex_desc.txt'))
+    compareConstructions('tiny_basic x 20',
+                         [c.regex for c in lexDesc.classes] * 20)
+
+
+if __name__ == "__main__":
+    benchmarkParsers()
+    benchmarkConstructions()
@@ -1,7 +1,14 @@
 from automata import Automata
-import description_reader
+from subset_construction import getNfaTables
 
 def revers(nfa):
+    """ Reverses an automaton: every transition is flipped, the accept states
+        become the start states and the start state(s) become the accept
+        states. The supplied automaton is left untouched.
+
+        :param Automata nfa: The automaton to reverse.
+        :rtype: Automata
+    """
     new_accept = []
     if isinstance(nfa.start, list):
         for s in nfa.start:
@@ -14,127 +21,51 @@ def revers(nfa):
         new_start.append(s)
     new_transitions = []
     for s in nfa.transitions:
-        temp = s[0]
-        s[0] = s[2]
-        s[2] = temp
-        new_transitions.append(s)
-    return Automata(nfa.states, new_start, new_accept, new_transitions, nfa.alphabet)
+        new_transitions.append([s[2], list(s[1]), s[0]])
+    return Automata(list(nfa.states), new_start, new_accept, new_transitions, nfa.alphabet)
 
 def determinis(nfa):
-#making all states
-    new_states = []
-    empty = []
-    new_states.append(empty)
-    for i in range(len(nfa.states)):
-        for s in new_states:
-            for i in range(len(nfa.states)):
-                temp = []
-                for x in s: temp.append(x)
-                if nfa.states[i] not in temp:
-                    temp.append(nfa.states[i])
-                temp.sort()
-                if temp not in new_states:
-                    new_states.append(temp)
-
-#making new start
-    new_start = []
-    temp = []
-    for s in nfa.start:temp.append(s)
-    temp.sort()
-    new_start.append(temp)
-
-#making new accept
-    new_accept = []
-    for s in new_states:
-        is_accept = False
-        for x in s:
-            if x in nfa.accepts:
-                is_accept = True
-        if is_accept:new_accept.append(s)
+    """ Determinizes an automaton with (possibly) several start states and
+        epsilon transitions. Only the state sets reachable from the start
+        states are built, keyed by their bitmask in the NFA's tables. The
+        resulting states are numbered in the order they are found, starting
+        with the start state 0.
 
-#make new transitions
-    new_transitions = []
-    for from_state in new_states:
-        for alpha in nfa.alphabet:
-            to_state = []
-            for s in from_state:
-                #print "from_state : ",from_state," s : ",s," alpha : ",alpha
-                terminal = nfa.nodes[s].getTransitionState(alpha)
-                if not terminal == None:
-                    for t in terminal:
-                        if t not in to_state: to_state.append(t)
-            #print "from_state: ",from_state, "alpha : ",alpha,"to_state : ",to_state
-            to_state.sort()
-            alphabet = []
-            alphabet.append(alpha)
-            new_t = []
-            new_t.append(from_state)
-            new_t.append(alphabet)
-            new_t.append(to_state)
-            new_transitions.append(new_t)
-    #for x in new_transitions:print x
-    #print new_transitions
-    
-    #change state names
-    counter = 0
-    for x in new_states:
-        if x in new_start:
-            new_start.remove(x)
-            new_start.append(counter)
-        if x in new_accept:
-            new_accept.remove(x)
-            new_accept.append(counter)
-        for s in new_transitions:
-            if s[0] == x:s[0] = counter
-            if s[2] == x:s[2] = counter
-        x = counter
-        counter = counter + 1
-    new_new_states = []
-    for i in range(len(new_states)):new_new_states.append(i)
-    #print new_new_states
-    #print new_start
-    #print new_accept
-    #for x in new_transitions:print x
-    return Automata(new_new_states, new_start, new_accept, new_transitions, nfa.alphabet)
+        :param Automata nfa: The automaton to determinize.
+        :rtype: Automata
+    """
+    tables = getNfaTables(nfa)
+    alphabet = sorted(nfa.alphabet)
 
-def reachable(nfa):
-    possible = []
-    possible.append(nfa.start[0])
-    next_state = []
-    next_state.append(nfa.start[0])
-    while not next_state == []:
-        this_node = next_state[0]
-        next_state.remove(this_node)
-        for alpha in nfa.alphabet:
-            for s in nfa.nodes[this_node].getTransitionState(alpha):
-                if s not in possible:
-                    possible.append(s)
-                    if s not in next_state: next_state.append(s)
-    possible.sort()
+    new_states = [tables.start]
+    number = {tables.start: 0}
     new_accept = []
-    for s in nfa.accepts:
-        if s in possible: new_accept.append(s)
     new_transitions = []
-    for x in nfa.transitions:
-        if x[0] in possible and x[2] in possible:new_transitions.append(x)
-    #print "all states: ",possible
-    #print "stating point",nfa.start
-    #print new_accept
-    #for x in new_transitions: print x
-    return Automata(possible, nfa.start, new_accept, new_transitions, nfa.alphabet)
+    for from_state, mask in enumerate(new_states):
+        if mask & tables.accepts:
+            new_accept.append(from_state)
+        for alpha in alphabet:
+            to_mask = tables.step(mask, alpha)
+            if to_mask == 0:
+                continue
+            if to_mask not in number:
+                number[to_mask] = len(new_states)
+                new_states.append(to_mask)
+            new_transitions.append([from_state, [alpha], number[to_mask]])
 
+    return Automata(list(range(len(new_states))), 0, new_accept, new_transitions,
+                    nfa.alphabet)
 
 def convertNfaToMinDfa(nfa):
+    """ Converts an NFA into a minimal DFA with Brzozowski's algorithm:
+        reverse, determinize, reverse, determinize. Each determinization only
+        builds reachable states, so no separate pruning pass is needed.
+
+        :param Automata nfa: The automaton to convert.
+        :rtype: Automata
+    """
     nfa = revers(nfa)
-    print 1
     nfa = determinis(nfa)
-    print 2
-    nfa = reachable(nfa)
-    print 3
     nfa = revers(nfa)
-    print 4
     nfa = determinis(nfa)
-    print 5
-    nfa = reachable(nfa)
-    print 6
     return nfa
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""compiled_lexer.py: Saves compiled scanners to binary files, and loads them
+   back without parsing a description or building any automata.
+
+   A compiled lexer file is laid out as follows, with every integer stored
+   little endian:
+
+       header       magic, format version, number of states, number of
+                    symbols, start state, number of classes, and the size in
+                    bytes of the strings section
+       table        int32 transition table, one row of symbols per state,
+                    with -1 for missing transitions
+       tags         int32 class index accepted by each state, or -1
+       accepting    int8 accept flag of each state
+       strings      the symbols, then the name and relevance of each class,
+                    each as a uint32 length followed by its bytes
+
+   The file is read in one go when loaded, and the tables are copied
+   straight out of it, so nothing is parsed.
+"""
+
+import struct
+import sys
+from array import array
+from automata import DenseAutomata
+from scanner import Scanner
+
+MAGIC = 'LEXS'
+
+FORMAT_VERSION = 1
+"""Bumped whenever the layout of compiled lexer files changes."""
+
+HEADER = struct.Struct('<4sIIIIII')
+LENGTH = struct.Struct('<I')
+
+
+def save_scanner(scanner, path):
+    '''
+    Writes a compiled scanner to a file.
+
+    :param scanner a Scanner (not a LazyScanner) to save.
+    :param path the path of the file to write.
+    '''
+    dfa = scanner.dfa
+    if not isinstance(dfa, DenseAutomata):
+        raise Exception("Only fully compiled scanners can be saved")
+
+    strings = list(dfa.symbols)
+    for name, relevance in scanner.classes:
+        strings += [name, relevance]
+    strings = ''.join(LENGTH.pack(len(s)) + s for s in map(str, strings))
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(dfa.names),
+                            len(dfa.symbols), dfa.start, len(scanner.classes),
+                            len(strings)))
+        f.write(_little_endian(array('i', dfa.table)).tostring())
+        f.write(_little_endian(array('i', dfa.tags)).tostring())
+        f.write(array('b', dfa.accepting).tostring())
+        f.write(strings)
+
+
+def load_scanner(path):
+    '''
+    Loads a scanner saved by save_scanner.
+
+    :param path the path of the file to read.
+    :return a ready to use Scanner.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise Exception(path + " is not a compiled lexer")
+    magic, version, states, width, start, class_count, string_bytes = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise Exception(path + " is not a compiled lexer")
+    if version != FORMAT_VERSION:
+        raise Exception(path + " is a version " + str(version) + \
+                        " compiled lexer, expected version " + \
+                        str(FORMAT_VERSION))
+
+    # Every section has to be there in full, and the strings have to fit
+    # inside their section, or struct would fail part way through.
+    strings_end = HEADER.size + states * (4 * width + 4 + 1) + string_bytes
+    if len(data) < strings_end:
+        raise Exception(path + " is not a compiled lexer")
+
+    offset = HEADER.size
+    table, offset = _read_array(data, offset, 'i', states * width)
+    tags, offset = _read_array(data, offset, 'i', states)
+    accepting, offset = _read_array(data, offset, 'b', states)
+
+    strings = []
+    for i in range(width + 2 * class_count):
+        if offset + LENGTH.size > strings_end:
+            raise Exception(path + " is not a compiled lexer")
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + length > strings_end:
+            raise Exception(path + " is not a compiled lexer")
+        strings.append(data[offset:offset + length])
+        offset += length
+
+    # States and tags out of range would only fail part way through a scan.
+    if start >= states or \
+       (table and (min(table) < DenseAutomata.DEAD or max(table) >= states)) or \
+       (tags and (min(tags) < DenseAutomata.DEAD or max(tags) >= class_count)):
+        raise Exception(path + " is not a compiled lexer")
+
+    symbols = strings[:width]
+    classes = zip(strings[width::2], strings[width + 1::2])
+    dfa = DenseAutomata(range(states), symbols, start, accepting, tags, table)
+    return Scanner(dfa, classes)
+
+
+def _read_array(data, offset, typecode, count):
+    """Reads count little endian items of an array type out of data,
+       returning the array and the offset just past it."""
+    items = array(typecode)
+    end = offset + count * items.itemsize
+    items.fromstring(buffer(data, offset, end - offset))
+    return _little_endian(items), end
+
+
+def _little_endian(items):
+    """Swaps the bytes of an array between native and little endian order."""
+    if sys.byteorder != 'little':
+        items.byteswap()
+    return items
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""description_cache.py: An on-disk cache of objects built from description
+   files, so that unchanged descriptions don't have to be parsed and built
+   again. Entries are keyed by a hash of the description's contents and the
+   cache version, and the least recently used entries are evicted once the
+   cache grows past its size limit.
+"""
+
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+
+CACHE_VERSION = 1
+"""Bumped whenever the objects stored in the cache change, which makes every
+   existing entry a miss."""
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+"""The default limit on the total size of a cache directory, in bytes."""
+
+SUFFIX = '.pickle'
+
+
+def cached(cache_dir, kind, contents, build, cache_size=DEFAULT_CACHE_SIZE):
+    '''
+    Returns the object built from a description, loading it from the cache if
+    it is there, and otherwise building it and adding it to the cache.
+
+    :param cache_dir the directory holding the cache. It is created if it
+           doesn't exist.
+    :param kind the kind of object being built, such as 'automata'.
+    :param contents the contents of the description file.
+    :param build a function of no arguments that builds the object.
+    :param cache_size the most bytes the cache directory should hold.
+    :return the built object.
+    '''
+    key = hashlib.sha1(str(CACHE_VERSION) + '\0' + kind + '\0' + contents)
+    path = os.path.join(cache_dir, kind + '-' + key.hexdigest() + SUFFIX)
+
+    try:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        # Mark the entry as recently used.
+        os.utime(path, None)
+        return result
+    except Exception:
+        # Missing, unreadable and corrupt entries are simply rebuilt.
+        pass
+
+    result = build()
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # Write to a temporary file first, so that other processes never see a
+    # partially written entry.
+    handle, temp = tempfile.mkstemp(dir=cache_dir)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, path)
+    except (EnvironmentError, pickle.PicklingError):
+        # Objects that can't be pickled, or a full or read-only disk, only
+        # mean the result isn't cached.
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return result
+
+    evict(cache_dir, cache_size)
+    return result
+
+
+def evict(cache_dir, cache_size):
+    '''
+    Removes the least recently used entries of a cache directory until it
+    holds at most cache_size bytes.
+
+    :param cache_dir the directory holding the cache.
+    :param cache_size the most bytes the cache directory should hold.
+    '''
+    entries, total = [], 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(SUFFIX):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= cache_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+"""description_parser.py: A hand-written parser for automata and lexical
+   description files. It accepts exactly the inputs accepted by the pyparsing
+   grammar in description_reader.py and produces the same tokens, but works
+   in a single forward pass with a few precompiled regular expressions, which
+   is much faster for large descriptions.
+"""
+
+import re
+
+WHITESPACE = re.compile(r'[ \n\t\r]*')
+STATE = re.compile(r'[A-Za-z0-9]+')
+IDENTIFIER = re.compile(r'[!-~]+')
+
+# A symbol is a quote, then either a backslash and any printable character or
+# space, or a printable character or space other than a backslash. As in the
+# pyparsing grammar, a backslash is always taken as the start of an escape.
+SYMBOL = re.compile(r"'(?:\\[ -~]|[ -\[\]-~])")
+
+KEYWORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz'
+                          'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$')
+"""Characters that may not appear right before or after a keyword."""
+
+RELEVANCES = ('relevant', 'irrelevant', 'discard')
+
+
+def parseAutomata(text):
+    """ Parses the contents of a dfa or nfa description.
+
+        :param str text: The description.
+        :return: (states, start, accepts, transitions, alphabet), where
+                 transitions is a list of [from, [symbols], to] lists.
+        :rtype: tuple
+    """
+    parser = DescriptionParser(text)
+    if not (parser.keyword('dfa') or parser.keyword('nfa')):
+        parser.fail('"dfa" or "nfa"')
+
+    parser.expect('states')
+    states = parser.stateList()
+    parser.expect('end;')
+
+    parser.expect('initial')
+    start = parser.state()
+    if start is None:
+        parser.fail('a state')
+
+    parser.expect('accept')
+    accepts = parser.stateList()
+    parser.expect('end;')
+
+    parser.expect('transitions')
+    transitions = []
+    while True:
+        transition = parser.transition()
+        if transition is None:
+            break
+        transitions.append(transition)
+    parser.expect('end;')
+
+    alphabet = parser.alphabet()
+    return states, start, accepts, transitions, alphabet
+
+
+def parseLexicalDescription(text):
+    """ Parses the contents of a lexical description.
+
+        :param str text: The description.
+        :return: (name, alphabet, classes), where each class is a
+                 [name, [regex tokens], relevance] list.
+        :rtype: tuple
+    """
+    parser = DescriptionParser(text)
+    parser.expect('language')
+    name = parser.identifier()
+
+    alphabet = parser.alphabet()
+
+    classes = []
+    while True:
+        clazz = parser.lexicalClass()
+        if clazz is None:
+            break
+        classes.append(clazz)
+    parser.expect('end;')
+
+    return name, alphabet, classes
+
+
+class DescriptionParser:
+    """Matches the elements of description files one at a time, skipping the
+       whitespace before each one. Methods returning None leave the position
+       where it was, so callers can backtrack by trying something else."""
+
+    def __init__(self, text):
+        # Like pyparsing, treat tabs as the spaces they expand to.
+        self.text = text.expandtabs()
+        self.pos = 0
+
+    def skip(self):
+        """Moves past any whitespace, returning the new position."""
+        self.pos = WHITESPACE.match(self.text, self.pos).end()
+        return self.pos
+
+    def fail(self, expected):
+        """Raises an exception describing what was expected at the current
+           position."""
+        text, pos = self.text, self.skip()
+        line = text.count('\n', 0, pos) + 1
+        column = pos - text.rfind('\n', 0, pos)
+        raise Exception("Parse error at line " + str(line) + ", column " + \
+                        str(column) + ": expected " + expected + ", found " + \
+                        repr(text[pos:pos + 20]))
+
+    def atKeyword(self, word):
+        """Indicates whether the keyword word is at the current position,
+           without moving past it."""
+        text, pos = self.text, self.skip()
+        end = pos + len(word)
+        return text.startswith(word, pos) \
+               and (end >= len(text) or text[end] not in KEYWORD_CHARS) \
+               and (pos == 0 or text[pos - 1] not in KEYWORD_CHARS)
+
+    def keyword(self, word):
+        """Moves past the keyword word if it is next, indicating whether it
+           was."""
+        if self.atKeyword(word):
+            self.pos += len(word)
+            return True
+        return False
+
+    def expect(self, word):
+        """Moves past the keyword word, which must be next."""
+        if not self.keyword(word):
+            self.fail('"' + word + '"')
+
+    def state(self):
+        """Returns the next state name, or None if there is none."""
+        if self.atKeyword('end;'):
+            return None
+        match = STATE.match(self.text, self.pos)
+        if match is None:
+            return None
+        self.pos = match.end()
+        return match.group()
+
+    def stateList(self):
+        """Returns the state names up to the next one that can't be read."""
+        states = []
+        while True:
+            state = self.state()
+            if state is None:
+                return states
+            states.append(state)
+
+    def identifier(self):
+        """Returns the next run of printable characters."""
+        match = IDENTIFIER.match(self.text, self.skip())
+        if match is None:
+            self.fail('an identifier')
+        self.pos = match.end()
+        return match.group()
+
+    def symbol(self, keepQuote=False):
+        """Returns the next symbol with its escapes decoded, or None if there
+           is none. The leading quote is kept if keepQuote is set, as it is for
+           symbols in regular expressions."""
+        match = SYMBOL.match(self.text, self.skip())
+        if match is None:
+            return None
+        self.pos = match.end()
+        token = match.group() if keepQuote else match.group()[1:]
+        return token.decode('string_escape') if "\\" in token else token
+
+    def symbolList(self):
+        """Returns the symbols up to the next one that can't be read."""
+        symbols = []
+        while True:
+            symbol = self.symbol()
+            if symbol is None:
+                return symbols
+            symbols.append(symbol)
+
+    def alphabet(self):
+        """Reads an alphabet definition, returning its symbols."""
+        self.expect('alphabet')
+        symbols = self.symbolList()
+        if not (self.keyword('end;') or self.keyword('end')):
+            self.fail('"end;" or "end"')
+        return symbols
+
+    def transition(self):
+        """Returns the next [from, [symbols], to] transition, or None if there
+           is none."""
+        start = self.pos
+        fromState = self.state()
+        if fromState is not None:
+            symbols = self.symbolList()
+            if self.keyword('-->'):
+                toState = self.state()
+                if toState is not None:
+                    return [fromState, symbols, toState]
+        self.pos = start
+        return None
+
+    def regex(self):
+        """Returns the tokens of a regular expression in prefix form, up to
+           the next one that can't be read."""
+        tokens = []
+        text = self.text
+        while True:
+            pos = self.skip()
+            if pos < len(text) and text[pos] in '*|+':
+                tokens.append(text[pos])
+                self.pos += 1
+                continue
+            symbol = self.symbol(keepQuote=True)
+            if symbol is None:
+                return tokens
+            tokens.append(symbol)
+
+    def lexicalClass(self):
+        """Returns the next [name, [regex tokens], relevance] class, or None
+           if there is none."""
+        start = self.pos
+        if self.keyword('class'):
+            match = IDENTIFIER.match(self.text, self.skip())
+            if match is not None:
+                self.pos = match.end()
+                if self.keyword('is'):
+                    tokens = self.regex()
+                    for relevance in RELEVANCES:
+                        if self.keyword(relevance):
+                            if self.keyword('end;'):
+                                return [match.group(), tokens, relevance]
+                            break
+        self.pos = start
+        return None
@@ -6,6 +6,8 @@ from pyparsing import *
 from automata import Automata
 from regex import *
 from scanner import LexicalDesc
+from description_cache import cached, DEFAULT_CACHE_SIZE
+from description_parser import parseAutomata, parseLexicalDescription
 
 #######################
 # General definitions #
@@ -101,19 +103,49 @@ LexicalDescription = language_keyword \
 # example: [z++, [ [class 1], [class 2], [class 3] ] ]
 
 
-def ConstructAutomata(file):
+def ConstructAutomata(file, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                      parser='fast'):
     """Parses the supplied automata file, then constructs and returns an 
        Automata object.
 
        :param str | file file: File object or URI.
+       :param str cache_dir: Directory to cache the Automata in, keyed by the
+                             contents of the file (see description_cache).
+                             Nothing is cached if this is None.
+       :param int cache_size: The most bytes the cache directory may hold.
+       :param str parser: 'fast' for the parser in description_parser.py, or
+                          'pyparsing' for the grammar in this file.
        :rtype: Automata
     """
-    fa = FiniteAutomata.parseFile(file)
+    contents = readDescription(file)
+    if cache_dir is not None:
+        return cached(cache_dir, 'automata', contents,
+                      lambda: buildAutomata(contents, parser), cache_size)
+    return buildAutomata(contents, parser)
+
+
+def buildAutomata(contents, parser='fast'):
+    """Parses the contents of an automata file into an Automata object.
+
+       :param str contents: The automata description.
+       :param str parser: 'fast' or 'pyparsing' (see ConstructAutomata).
+       :rtype: Automata
+    """
+    if parser == 'pyparsing':
+        fa = FiniteAutomata.parseString(contents)
+        # Note on fa.Start: parseResult objects always return values in lists,
+        # so this must be dereferenced.
+        states, start, accepts, transitions, alphabet = \
+            fa.States, fa.Start[0], fa.Accept, fa.Transitions, fa.Alphabet
+    else:
+        states, start, accepts, transitions, alphabet = parseAutomata(contents)
+
     # Alphabet check: if there are symbols in the transitions not in the
     # alphabet, throw an exception.
-    for trans in fa.Transitions:
+    alphabetSet = set(alphabet)
+    for trans in transitions:
         for symbol in trans[1]:
-            if symbol not in fa.Alphabet.asList():
+            if symbol not in alphabetSet:
                 trans_str = trans[0] + ' \''\
                             + " \'".join(trans[1])\
                             + " --> " + trans[2]
@@ -122,27 +154,62 @@ def ConstructAutomata(file):
                                 + " contains the symbol \'" + symbol + "\' "\
                                 + "which is not in the described alphabet!")
 
-    # Note on fa.Start: parseResult objects always return values in lists,
-    # so this must be dereferenced.
-    return Automata(fa.States, fa.Start[0], fa.Accept, fa.Transitions,\
-                    fa.Alphabet)
+    return Automata(states, start, accepts, transitions, alphabet)
 
 
 
-def ConstructLexicalDescription(file):
+def ConstructLexicalDescription(file, cache_dir=None,
+                                cache_size=DEFAULT_CACHE_SIZE, parser='fast'):
     """Parses the supplied lexical description file, then constructs and returns
        a lexical description object.
 
        :param str | file file: File object or URI.
+       :param str cache_dir: Directory to cache the description in, keyed by
+                             the contents of the file (see description_cache).
+                             Cached descriptions are already compiled. Nothing
+                             is cached if this is None.
+       :param int cache_size: The most bytes the cache directory may hold.
+       :param str parser: 'fast' for the parser in description_parser.py, or
+                          'pyparsing' for the grammar in this file.
+       :rtype: LexicalDesc
+    """
+    contents = readDescription(file)
+    if cache_dir is not None:
+        return cached(cache_dir, 'language', contents,
+                      lambda: compiledLexicalDescription(contents, parser),
+                      cache_size)
+    return buildLexicalDescription(contents, parser)
+
+
+def compiledLexicalDescription(contents, parser='fast'):
+    """Builds a lexical description and compiles its scanner."""
+    lexDesc = buildLexicalDescription(contents, parser)
+    lexDesc.compile()
+    return lexDesc
+
+
+def buildLexicalDescription(contents, parser='fast'):
+    """Parses the contents of a lexical description file into a lexical
+       description object.
+
+       :param str contents: The lexical description.
+       :param str parser: 'fast' or 'pyparsing' (see
+                          ConstructLexicalDescription).
        :rtype: LexicalDesc
     """
-    lexDesc = LexicalDescription.parseFile(file)
+    if parser == 'pyparsing':
+        lexDesc = LexicalDescription.parseString(contents)
+        name, alphabet, classes = \
+            lexDesc.Name, lexDesc.Alphabet, lexDesc.Classes
+    else:
+        name, alphabet, classes = parseLexicalDescription(contents)
 
     # Alphabet check: if there are symbols in the regexes defined in this
     # lexical description that aren't in the alphabet, raise an exception.
-    for clazz in lexDesc.Classes:
+    alphabetSet = set(alphabet)
+    for clazz in classes:
         for symbol in clazz[1]:
-            if (len(symbol) > 1) and (symbol[1:] not in lexDesc.Alphabet.asList()):
+            if (len(symbol) > 1) and (symbol[1:] not in alphabetSet):
                 regex_str = ' '.join(clazz[1])
                 raise Exception("Alphabet Error! The regex:\n\n" \
                                 + "    " + regex_str + "\n\n" \
@@ -150,10 +217,22 @@ def ConstructLexicalDescription(file):
                                 + "which is not in the described alphabet!")
 
 
-    return LexicalDesc(lexDesc.Name, lexDesc.Alphabet, lexDesc.Classes)
+    return LexicalDesc(name, alphabet, classes)
+
+
+def readDescription(file):
+    """Returns the contents of a description file.
+
+       :param str | file file: File object or URI.
+       :rtype: str
+    """
+    if hasattr(file, 'read'):
+        return file.read()
+    with open(file) as f:
+        return f.read()
 
 
 if __name__ == "__main__":
     lex_desc = ConstructLexicalDescription("./testdata/tiny_basic_lex_desc.txt")
-    tbProgram = open('./testdata/tinyBasicProgram.txt').read()
-    print lex_desc.scan(tbProgram)
+    tbProgram = open('./testdata/tinyBasicProgram.txt')
+    print list(lex_desc.iter_tokens(tbProgram))
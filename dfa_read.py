@@ -1,18 +1,168 @@
+from multiprocessing import Pool
+from automata import DenseAutomata, getDenseAutomata
+from lazy_dfa import LazyDfa
+from subset_construction import getNfaTables
+
+
 def dfa_valid_string(automata, testing_string, current_state=None, current_step=0):
+    """ Checks whether a DFA accepts a string (from current_step onward, starting
+        in current_state if given). Runs as a loop over the DFA's dense
+        transition table, so there is no limit on the string's length.
+
+        :param Automata | LazyDfa automata: The DFA to test against.
+        :param str testing_string: The string to test.
+        :rtype: bool
+    """
+    if isinstance(automata, LazyDfa):
+        return automata.matches(testing_string[current_step:])
+
+    dense = getDenseAutomata(automata)
     if current_state is None:
-        current_state = automata.start
+        state = dense.start
+    else:
+        state = dense.names.index(current_state)
+
+    return __dense_valid_string(dense, testing_string, state, current_step)
+
+
+def dfa_valid_strings(automata, strings, processes=None, chunksize=1000):
+    """ Checks a batch of strings against a DFA.
+
+        :param Automata automata: The DFA to test against.
+        :param iterable[str] strings: The strings to test.
+        :param int processes: If more than one, the strings are checked across
+                              a pool of this many worker processes, each sent
+                              the DFA once and the strings in chunks.
+        :param int chunksize: The number of strings sent to a worker at a time.
+        :return: Whether each string is accepted, in order.
+        :rtype: list[bool]
+    """
+    dense = getDenseAutomata(automata)
+
+    if processes is None or processes <= 1:
+        return [__dense_valid_string(dense, string, dense.start, 0)
+                for string in strings]
 
-    if current_step == len(testing_string):
-        # for x in automata.accepts:
-        #     if current_state == x: return True
-        # return False
-        return current_state in automata.accepts
+    pool = Pool(processes, _init_worker, (dense,))
+    try:
+        return pool.map(_worker_valid_string, strings, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def dfa_valid_array(automata, records):
+    """ Checks a batch of strings against a DFA all at once with NumPy. Every
+        string is advanced one column at a time through the DFA's transition
+        table with fancy indexing, so the Python-level loop runs once per
+        character position rather than once per character. Strings in a
+        string array that are shorter than its width (NumPy pads them with
+        NULs) stop advancing at their own length.
+
+        Requires NumPy, which is only imported when this is called.
+
+        :param Automata automata: The DFA to test against.
+        :param numpy.ndarray records: Either a 1-D array of fixed-width byte
+                                      or unicode strings (dtype 'S' or 'U'),
+                                      or a 2-D array of character codes with
+                                      one string per row. Codes must not be
+                                      negative.
+        :return: A boolean array, True where the string is accepted.
+        :rtype: numpy.ndarray
+    """
+    import numpy
+
+    dense = getDenseAutomata(automata)
+    width = len(dense.symbols)
+
+    records = numpy.asarray(records)
+    if len(records) == 0:
+        return numpy.zeros(0, dtype=bool)
+    if records.dtype.kind == 'S':
+        codes = records.view(numpy.uint8).reshape(len(records), records.dtype.itemsize)
+        lengths = numpy.char.str_len(records)
+    elif records.dtype.kind == 'U':
+        codes = records.view(numpy.uint32).reshape(len(records), records.dtype.itemsize // 4)
+        lengths = numpy.char.str_len(records)
     else:
-        next_state = automata.nodes[current_state]\
-            .getTransitionState(testing_string[current_step])
-        if next_state is None:
-            return False
+        codes = records.reshape(len(records), -1)
+        lengths = None
+        if codes.size and codes.min() < 0:
+            raise Exception("Character codes must not be negative")
+
+    # The dense table gets an extra row for a dead state that every missing
+    # transition goes to, and an extra column that every character code not
+    # in the alphabet maps to.
+    dead_state = len(dense.names)
+    table = numpy.full((dead_state + 1, width + 1), dead_state, dtype=numpy.int32)
+    flat = numpy.frombuffer(dense.table, dtype=numpy.int32).reshape(dead_state, width)
+    table[:dead_state, :width] = numpy.where(flat == DenseAutomata.DEAD, dead_state, flat)
+    accepting = numpy.zeros(dead_state + 1, dtype=bool)
+    accepting[:dead_state] = numpy.frombuffer(dense.accepting, dtype=numpy.int8) != 0
+
+    code_points = [ord(symbol) for symbol in dense.symbols]
+    max_code = max(code_points + [int(codes.max()) if codes.size else 0])
+    columns = numpy.full(max_code + 1, width, dtype=numpy.int32)
+    columns[code_points] = numpy.arange(width, dtype=numpy.int32)
+
+    states = numpy.full(len(codes), dense.start, dtype=numpy.int32)
+    for position in range(codes.shape[1]):
+        moved = table[states, columns[codes[:, position]]]
+        if lengths is None:
+            states = moved
         else:
-            next_state = next_state[0]  # DFA - should only be one state.
-            return dfa_valid_string(automata, testing_string,
-                                    next_state, current_step + 1)
+            states = numpy.where(position < lengths, moved, states)
+
+    return accepting[states]
+
+
+def __dense_valid_string(dense, testing_string, state, current_step):
+    """Runs a dense DFA from state over testing_string[current_step:]."""
+    table, symbols = dense.table, dense.symbolIndex
+    width = len(dense.symbols)
+
+    i, length = current_step, len(testing_string)
+    while i < length:
+        column = symbols.get(testing_string[i])
+        if column is None:
+            return False
+        state = table[state * width + column]
+        if state == DenseAutomata.DEAD:
+            return False
+        i += 1
+
+    return bool(dense.accepting[state])
+
+
+# The DFA each pool worker checks strings against, set once per worker.
+_worker_dfa = None
+
+
+def _init_worker(dense):
+    global _worker_dfa
+    _worker_dfa = dense
+
+
+def _worker_valid_string(testing_string):
+    return __dense_valid_string(_worker_dfa, testing_string, _worker_dfa.start, 0)
+
+
+def nfa_valid_string(automata, testing_string):
+    """ Checks a string against an NFA without determinizing it, by tracking
+        the set of states the NFA could be in after each symbol. State sets
+        are bitmasks, and epsilon closures come precomputed from the NFA's
+        tables, so each symbol costs one table lookup per current state.
+
+        :param Automata automata: The NFA (or DFA) to test against.
+        :param str testing_string: The string to test.
+        :rtype: bool
+    """
+    tables = getNfaTables(automata)
+    current_states = tables.start
+
+    for symbol in testing_string:
+        current_states = tables.step(current_states, symbol)
+        if current_states == 0:
+            return False
+
+    return bool(current_states & tables.accepts)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+""" Language equivalence and inclusion checks between automata. Both work
+    directly on NFAs (or DFAs) by exploring subset states on the fly, so
+    neither automaton is ever fully determinized.
+"""
+from collections import deque
+from subset_construction import getNfaTables, maskBits
+
+
+def equivalent(a, b):
+    """ Indicates whether two automata accept the same language.
+
+        :param Automata a: The first automaton.
+        :param Automata b: The second automaton.
+        :rtype: bool
+    """
+    return equivalenceCounterexample(a, b) is None
+
+
+def includes(a, b):
+    """ Indicates whether every string accepted by b is also accepted by a.
+
+        :param Automata a: The including automaton.
+        :param Automata b: The included automaton.
+        :rtype: bool
+    """
+    return inclusionCounterexample(a, b) is None
+
+
+def equivalenceCounterexample(a, b):
+    """ Checks two automata for equivalence with Hopcroft and Karp's union-find
+        algorithm. Pairs of subset states, one from each automaton, are
+        explored breadth first from the start states; a pair whose states are
+        already known to be equivalent is skipped, and a pair that disagrees
+        on acceptance is a counterexample.
+
+        :param Automata a: The first automaton.
+        :param Automata b: The second automaton.
+        :return: A string accepted by exactly one of the automata, or None if
+                 they are equivalent.
+        :rtype: str | None
+    """
+    tablesA, tablesB = getNfaTables(a), getNfaTables(b)
+    alphabet = sorted(a.alphabet | b.alphabet)
+
+    # Union-find over subset states, which are tagged with the automaton they
+    # belong to as the masks of both are numbered independently.
+    parent = {}
+
+    def find(state):
+        root = state
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while state != root:
+            parent[state], state = root, parent.get(state, state)
+        return root
+
+    queue = deque([(tablesA.start, tablesB.start, '')])
+    while queue:
+        maskA, maskB, word = queue.popleft()
+        rootA, rootB = find(('a', maskA)), find(('b', maskB))
+        if rootA == rootB:
+            continue
+
+        if bool(maskA & tablesA.accepts) != bool(maskB & tablesB.accepts):
+            return word
+
+        parent[rootA] = rootB
+        for symbol in alphabet:
+            queue.append((tablesA.step(maskA, symbol),
+                          tablesB.step(maskB, symbol), word + symbol))
+
+    return None
+
+
+def inclusionCounterexample(a, b):
+    """ Checks whether the language of b is included in that of a, using an
+        antichain based exploration of the product of b's states with subset
+        states of a. A pair (q, S) makes any pair (q, S') with S a subset of
+        S' redundant, as S' accepts at least whatever S does, so only the
+        minimal sets found so far are kept for each state q.
+
+        :param Automata a: The including automaton.
+        :param Automata b: The included automaton.
+        :return: A string accepted by b but not by a, or None if there is no
+                 such string.
+        :rtype: str | None
+    """
+    tablesA, tablesB = getNfaTables(a), getNfaTables(b)
+
+    # antichain[q] holds the minimal masks of a seen together with state q of b.
+    antichain = {}
+
+    def visit(q, maskA):
+        sets = antichain.setdefault(q, [])
+        for seen in sets:
+            if seen & ~maskA == 0:
+                return False
+        sets[:] = [seen for seen in sets if maskA & ~seen != 0]
+        sets.append(maskA)
+        return True
+
+    queue = deque()
+    for q in maskBits(tablesB.start):
+        if visit(q, tablesA.start):
+            queue.append((q, tablesA.start, ''))
+
+    while queue:
+        q, maskA, word = queue.popleft()
+        if tablesB.accepts & (1 << q) and not maskA & tablesA.accepts:
+            return word
+
+        for symbol, maskB in tablesB.successors[q].items():
+            nextA = tablesA.step(maskA, symbol)
+            for nextQ in maskBits(maskB):
+                if visit(nextQ, nextA):
+                    queue.append((nextQ, nextA, word + symbol))
+
+    return None
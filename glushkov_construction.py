@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+from automata import *
+from regex import *
+from regex_builder import RegexBuilder
+
+'''General notes for Glushkov's construction:
+
+The position automaton of a regex has one state for every occurrence
+of a symbol in it (a "position"), plus a start state, and no epsilon
+transitions at all. A transition into a position is always on that
+position's symbol. Which positions can start a match (first), end a
+match (last) and come right after each other (follow) are computed
+bottom up over the regex tree, along with whether the regex accepts
+the empty string (nullable):
+
+    symbol a at p:  first = last = {p}, not nullable
+    nil:            first = last = {}, nullable
+    empty:          first = last = {}, not nullable
+    l | r:          first = first(l) + first(r), same for last
+    l r:            first = first(l) + first(r) if l is nullable
+                    last = last(r) + last(l) if r is nullable
+                    every position in last(l) is followed by first(r)
+    * e:            first, last of e; nullable
+                    every position in last(e) is followed by first(e)
+
+The start state moves to first, the states in last accept, and the
+start state accepts too if the regex is nullable.
+
+'''
+
+
+class GlushkovBuilder(RegexBuilder):
+    """Builds position automata from regular expression trees. Positions are
+       numbered from 1 within a build, with 0 being the start state. Each
+       built tree is the (nullable, first, last) triple of its positions."""
+
+    def __init__(self):
+        self.symbols = [None]
+        """The symbol of each position, indexed by position."""
+
+        self.follow = [set()]
+        """The positions that can follow each position."""
+
+        self.alphabet = set()
+        """The symbols of every expression built so far."""
+
+    def constructCharacter(self, character):
+        """Adds a position for a symbol."""
+        position = len(self.symbols)
+        self.symbols.append(character)
+        self.follow.append(set())
+        self.alphabet.add(character)
+        return False, frozenset([position]), frozenset([position])
+
+    def constructEpsilon(self):
+        """The empty string has no positions, and is nullable."""
+        return True, frozenset(), frozenset()
+
+    def constructEmpty(self):
+        """The empty language has no positions, and isn't nullable."""
+        return False, frozenset(), frozenset()
+
+    def constructRepetition(self, inner):
+        """Lets the last positions of inner be followed by its first ones."""
+        nullable, first, last = inner
+        for position in last:
+            self.follow[position] |= first
+        return True, first, last
+
+    def constructAlternative(self, left, right):
+        """Joins the first and last positions of either side."""
+        return left[0] or right[0], left[1] | right[1], left[2] | right[2]
+
+    def constructConcatenation(self, left, right):
+        """Lets the last positions of left be followed by the first of right."""
+        for position in left[2]:
+            self.follow[position] |= right[1]
+        return (left[0] and right[0],
+                left[1] | right[1] if left[0] else left[1],
+                left[2] | right[2] if right[0] else right[2])
+
+    def toAutomata(self, first, accepts):
+        """Creates the position automaton of everything built so far.
+
+           :param set[int] first: The positions the start state moves to.
+           :param dict[int, int] accepts: Maps each accepting position (or 0
+                                          for the start state) to its tag, or
+                                          to None if it isn't tagged.
+           :rtype: Automata
+        """
+        self.follow[0] = set(first)
+        edges = [(fromState, self.symbols[toState], toState)
+                 for fromState, following in enumerate(self.follow)
+                 for toState in sorted(following)]
+        return self.assemble(len(self.symbols), edges, 0,
+                             sorted(accepts.items()))
+
+
+def convertRegexToPositionNFA(node):
+    """Constructs the epsilon-free position automaton of a regular expression
+       tree with Glushkov's construction.
+
+       :param Production node: The regular expression tree.
+       :rtype: Automata
+    """
+    builder = GlushkovBuilder()
+    nullable, first, last = builder.build(node)
+
+    accepts = dict.fromkeys(last)
+    if nullable:
+        accepts[0] = None
+    return builder.toAutomata(first, accepts)
+
+
+def convertRegexListToPositionNFA(nodes):
+    """Constructs a single tagged position automaton recognizing the union of
+       several regular expression trees. The regexes share the start state,
+       and the accepting positions of the i'th regex are tagged with i, as in
+       thompsons_construction.convertRegexListToNFA. The start state is tagged
+       with the first nullable regex, if there is one.
+
+       :param list[Production] nodes: The regular expression trees, in priority
+                                      order.
+       :rtype: Automata
+    """
+    builder = GlushkovBuilder()
+    first, accepts = set(), {}
+    for tag, node in enumerate(nodes):
+        nullable, subFirst, subLast = builder.build(node)
+        first |= subFirst
+        for position in subLast:
+            accepts[position] = tag
+        if nullable and 0 not in accepts:
+            accepts[0] = tag
+
+    return builder.toAutomata(first, accepts)
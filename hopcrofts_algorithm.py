@@ -1,69 +1,150 @@
-from automata import Automata
-from description_reader import ConstructAutomata
+from automata import Automata, DenseAutomata
 
 
 def hopcroftMinimize(dfa):
-    P = [set(dfa.accepts),set(dfa.nodes.keys()).difference(set(dfa.accepts))]
-    W = []
-    if len(set(dfa.accepts)) > 1 : W.append(set(dfa.accepts))
-    if len(set(dfa.nodes.keys()).difference(set(dfa.accepts))): \
-           W.append(set(dfa.nodes.keys()).difference(set(dfa.accepts)))
-
-    while len(W) != 0:
-        A = W[0]
-        W.remove(A)
-        for c in dfa.alphabet:
-            X = []
-            for from_state in A:
-                to_state = dfa.nodes[from_state].getTransitionState(c)
-                # Only one possible state for DFAs!
-                if to_state is not None: to_state = to_state[0]  
-                if len(X) == 0 : X.append(from_state)
+    """ Minimizes a DFA with Hopcroft's partition refinement algorithm, in
+        O(n k log n) time for n states and k symbols.
+
+        States start out partitioned into accepting and non-accepting states
+        (and, for tagged DFAs, by tag). A worklist of splitter blocks is then
+        used to split every block whose states disagree on which side of a
+        splitter they move to, always queueing the smaller half of a split
+        block. Missing transitions are treated as moves to an implicit dead
+        state, which is left out of the result along with any states that are
+        equivalent to it or unreachable.
+
+        :param Automata dfa: The DFA to minimize.
+        :rtype: Automata
+    """
+    dense = DenseAutomata.fromAutomata(dfa)
+    width = len(dense.symbols)
+
+    # State n is the implicit dead state that missing transitions go to, so
+    # table[q * width + c] is the state q moves to on the symbol in column c.
+    n = len(dense.names)
+    dead = n
+    table = [dead if toState == DenseAutomata.DEAD else toState
+             for toState in dense.table] + [dead] * width
+
+    # Inverse transition table: inverse[c][q] lists the states moving to q on
+    # the symbol in column c.
+    inverse = [{} for c in range(width)]
+    for q in range(n + 1):
+        for c in range(width):
+            inverse[c].setdefault(table[q * width + c], []).append(q)
+
+    # The partition is kept as one array of states in which every block is a
+    # contiguous slice elements[first[b]:last[b]]. position[q] is the index of
+    # q in elements, and block[q] is the block q belongs to.
+    initial = {}
+    for q in range(n + 1):
+        if q == dead:
+            key = (False, DenseAutomata.DEAD)
+        else:
+            key = (bool(dense.accepting[q]), dense.tags[q])
+        initial.setdefault(key, []).append(q)
+
+    elements, first, last = [], [], []
+    block = [0] * (n + 1)
+    for states in initial.values():
+        first.append(len(elements))
+        for q in states:
+            block[q] = len(first) - 1
+            elements.append(q)
+        last.append(len(elements))
+    position = [0] * (n + 1)
+    for i, q in enumerate(elements):
+        position[q] = i
+
+    # All but the largest initial block need to be used as splitters.
+    largest = max(range(len(first)), key=lambda b: last[b] - first[b])
+    waiting = [b for b in range(len(first)) if b != largest]
+    inWaiting = [b != largest for b in range(len(first))]
+
+    # marked[b] counts the states of block b that have been moved to the front
+    # of its slice while gathering the preimage of a splitter.
+    marked = [0] * len(first)
+
+    while waiting:
+        splitter = waiting.pop()
+        inWaiting[splitter] = False
+        splitterStates = elements[first[splitter]:last[splitter]]
+
+        for c in range(width):
+            # Move every state with a c-transition into the splitter to the
+            # front of its block.
+            touched = []
+            for q in splitterStates:
+                for p in inverse[c].get(q, ()):
+                    b = block[p]
+                    front = first[b] + marked[b]
+                    if position[p] >= front:
+                        if marked[b] == 0:
+                            touched.append(b)
+                        other = elements[front]
+                        elements[front], elements[position[p]] = p, other
+                        position[other], position[p] = position[p], front
+                        marked[b] += 1
+
+            # Split each touched block into its marked and unmarked states.
+            for b in touched:
+                count = marked[b]
+                marked[b] = 0
+                if count == last[b] - first[b]:
+                    continue
+
+                newBlock = len(first)
+                first.append(first[b])
+                last.append(first[b] + count)
+                marked.append(0)
+                first[b] += count
+                for i in range(first[newBlock], last[newBlock]):
+                    block[elements[i]] = newBlock
+
+                if inWaiting[b]:
+                    waiting.append(newBlock)
+                    inWaiting.append(True)
+                elif count <= last[b] - first[b]:
+                    waiting.append(newBlock)
+                    inWaiting.append(True)
                 else:
-                    x_to_state = dfa.nodes[X[0]].getTransitionState(c)
-                    for p in P:
-                        if x_to_state is not None:
-                            if (to_state in p) and (x_to_state[0] in p): X.append(from_state)
-            if not len(X) == len(A):
-                X1 = set(X)
-                X2 = set(A).difference(X1)
-                P.remove(set(A))
-                P.append(X1)
-                P.append(X2)
-                if len(X1) > 1 : W.append(X1)
-                if len(X2) > 1 : W.append(X2)
-                break
-    new_states = []
-    for s in dfa.nodes.keys():
-        new_states.append(s)
-    new_accept = []
-    for s in dfa.accepts:
-        new_accept.append(s)
-    new_transitions = []
-    for s in dfa.transitions:
-        new_transitions.append(s)
-
-    for p in P:
-        if len(p) > 1:
-            this_state = None
-            if dfa.start in p: this_state = dfa.start
-            for current_state in p:
-                if this_state == None: this_state = current_state
-                elif not this_state == current_state:
-
-                    if current_state in new_states:
-                        new_states.remove(current_state)
-
-                    if current_state in new_accept:
-                        new_accept.remove(current_state)
-                        new_accept.append(this_state)
-                    remove_transitions = []
-                    for transition in new_transitions:
-                        if transition[0] == current_state:
-                            remove_transitions.append(transition)
-                        elif transition[2] == current_state:
-                            transition[2] = this_state
-                    for p in remove_transitions:
-                        new_transitions.remove(p)
-
-    return Automata(new_states, dfa.start, new_accept, new_transitions,dfa.alphabet)
+                    waiting.append(b)
+                    inWaiting[b] = True
+                    inWaiting.append(False)
+
+    # Build the minimized DFA from the blocks reachable from the start state,
+    # naming each block after the start state if it holds it, otherwise after
+    # its first state in the original order.
+    representative = {}
+    for q in range(n):
+        representative.setdefault(block[q], q)
+    representative[block[dense.start]] = dense.start
+
+    startBlock = block[dense.start]
+    reachable, frontier = set([startBlock]), [startBlock]
+    new_states, new_accept, new_transitions = [], [], []
+    for b in frontier:
+        q = representative[b]
+        name = dense.names[q]
+        new_states.append(name)
+        if dense.accepting[q]:
+            new_accept.append(name)
+
+        for c in range(width):
+            toBlock = block[table[q * width + c]]
+            if toBlock == block[dead]:
+                continue
+            if toBlock not in reachable:
+                reachable.add(toBlock)
+                frontier.append(toBlock)
+            new_transitions.append([name, [dense.symbols[c]],
+                                    dense.names[representative[toBlock]]])
+
+    minimized = Automata(new_states, dense.names[dense.start], new_accept,
+                         new_transitions, dfa.alphabet)
+    for b in reachable:
+        q = representative[b]
+        if dense.tags[q] != DenseAutomata.DEAD:
+            minimized.nodes[dense.names[q]].tag = dense.tags[q]
+
+    return minimized
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+""" A lazily built DFA for an NFA. Subset states are only constructed when
+    the input actually reaches them, and are kept in a bounded cache, so large
+    NFAs can be matched without paying for a full subset construction.
+"""
+from collections import OrderedDict
+from subset_construction import getNfaTables, stateSetTag
+
+
+class LazyDfa:
+    """Simulates the DFA of an NFA, building its states on demand. States are
+       identified by the bitmask of the NFA states they hold (see NfaTables),
+       and 0 is the dead state."""
+
+    def __init__(self, nfa, cache_size=4096):
+        """
+        :param Automata nfa: The NFA to simulate.
+        :param int cache_size: The most DFA states to keep at once.
+        """
+        self.nfa = nfa
+        self.tables = getNfaTables(nfa)
+        self.start = self.tables.start
+        self.cache_size = cache_size
+
+        self.states = OrderedDict()
+        """Cached DFA states, least recently used first. Each maps a mask to
+           a [transitions, accept, tag] list, where transitions maps symbols
+           to next masks as they are computed."""
+
+        self.evictions = 0
+        """The number of states evicted from the cache so far."""
+
+        self.recentEvictions = 0
+        """Evictions counted across calls, decayed along with recentSteps."""
+
+        self.recentSteps = 0
+        """Input symbols stepped over across calls. Both counts are halved
+           whenever this passes window, so they follow the recent eviction
+           rate rather than the rate since any one match started."""
+
+        self.window = 16 * cache_size
+        """The number of recent steps the statistics roughly cover."""
+
+    def refresh(self):
+        """ Starts over from the NFA's current tables, with an empty cache, if
+            the NFA has been changed since the cached states were built.
+        """
+        if self.nfa.tables is not self.tables:
+            self.tables = getNfaTables(self.nfa)
+            self.start = self.tables.start
+            self.states.clear()
+
+    def state(self, mask):
+        """ Returns the cached [transitions, accept, tag] entry of a state,
+            building it (and evicting the least recently used state if the
+            cache is full) if needed.
+
+            :param int mask: The state to look up.
+            :rtype: list
+        """
+        entry = self.states.pop(mask, None)
+        if entry is None:
+            accepts = mask & self.tables.accepts
+            entry = [{}, bool(accepts),
+                     stateSetTag(self.tables.maskNodes(accepts))]
+            if len(self.states) >= self.cache_size:
+                self.states.popitem(last=False)
+                self.evictions += 1
+                self.recentEvictions += 1
+        self.states[mask] = entry
+        return entry
+
+    def thrashing(self):
+        """ Indicates whether the cache has recently been evicting states
+            faster than it is useful. Once the cache has turned over
+            completely and at least one step in eight is evicting a state,
+            caching isn't paying off.
+
+            :rtype: bool
+        """
+        return self.recentEvictions > self.cache_size and \
+               self.recentEvictions * 8 > self.recentSteps
+
+    def count_step(self, steps=1):
+        """ Counts input symbols towards the recent cache statistics, and
+            indicates whether the cache is thrashing. The counts decay, so a
+            scanner that fell back to NFA simulation retries the cache once
+            its eviction rate has dropped.
+
+            :rtype: bool
+        """
+        self.recentSteps += steps
+        while self.recentSteps > self.window:
+            self.recentSteps //= 2
+            self.recentEvictions //= 2
+        return self.thrashing()
+
+    def matches(self, string):
+        """ Indicates whether the NFA accepts the whole string.
+
+            :param str string: The string to test.
+            :rtype: bool
+        """
+        self.refresh()
+        mask, steps = self.start, 0
+        for symbol in string:
+            if self.count_step():
+                # Fall back to plain NFA simulation for the rest of the input.
+                self.count_step(len(string) - steps - 1)
+                return self.__simulate(mask, string[steps:])
+
+            transitions = self.state(mask)[0]
+            if symbol not in transitions:
+                transitions[symbol] = self.tables.step(mask, symbol)
+            mask = transitions[symbol]
+            if mask == 0:
+                return False
+            steps += 1
+
+        return self.state(mask)[1]
+
+    def longest_match(self, string, pos):
+        """ Finds the longest non-empty prefix of string[pos:] accepted by the
+            NFA, in the same form as Scanner.longest_match.
+
+            :param str string: The string being scanned.
+            :param int pos: The offset to start matching at.
+            :return: (end, tag, stop), with end and tag being (pos, None) if
+                     nothing matches, and stop the offset the DFA died on.
+            :rtype: tuple
+        """
+        return self.continue_match(string, pos, None, pos, None)[:3]
+
+    def continue_match(self, string, i, mask, end, tag):
+        """ Carries on with a match that has already run part of the way, in
+            the same form as Scanner.continue_match.
+
+            :param str string: The string being scanned.
+            :param int i: The offset to carry on from.
+            :param int mask: The state the match has reached, or None to start
+                             a new match at i.
+            :param int end: The end of the longest match so far.
+            :param tag: The tag of the longest match so far, or None.
+            :return: (end, tag, stop, mask), as for longest_match plus the
+                     state at stop.
+            :rtype: tuple
+        """
+        if mask is None:
+            self.refresh()
+            mask = self.start
+
+        length = len(string)
+        while i < length:
+            if self.count_step():
+                mask = self.tables.step(mask, string[i])
+                if mask == 0:
+                    break
+                i += 1
+                accepts = mask & self.tables.accepts
+                if accepts:
+                    end = i
+                    tag = stateSetTag(self.tables.maskNodes(accepts))
+                continue
+
+            transitions = self.state(mask)[0]
+            symbol = string[i]
+            if symbol not in transitions:
+                transitions[symbol] = self.tables.step(mask, symbol)
+            mask = transitions[symbol]
+            if mask == 0:
+                break
+            i += 1
+            entry = self.state(mask)
+            if entry[1]:
+                end, tag = i, entry[2]
+
+        return end, tag, i, mask
+
+    def __simulate(self, mask, string):
+        """Runs the NFA over string from the states in mask without caching."""
+        for symbol in string:
+            mask = self.tables.step(mask, symbol)
+            if mask == 0:
+                return False
+        return bool(mask & self.tables.accepts)
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+from automata import DenseAutomata
+
+
 class Production:
     '''
     Defines the base class that all Regex inherit from. 
@@ -11,8 +15,38 @@ class Production:
         pass
 
     def consume(self, string):
+        '''
+        Matches as much of the front of string as possible.
+
+        Returns the matched prefix and the leftover suffix, or None and the
+        whole string if this expression can never match.
+        '''
+        end = self.consume_at(string, 0)
+        if end is None:
+            return None, string
+        return string[:end], string[end:]
+
+    def consume_at(self, text, pos):
+        '''
+        Matches as much of text as possible, starting at offset pos, without
+        copying any of it.
+
+        Returns the offset one past the end of the match (pos if nothing was
+        matched), or None if this expression can never match. Compiled
+        expressions follow the same contract (see CompiledRegex.consume_at).
+        '''
         pass
 
+    def compile(self):
+        '''
+        Compiles this expression into a CompiledRegex backed by a minimal DFA
+        (Thompson's construction, subset construction, then Hopcroft's
+        algorithm). The most recently used compiled expressions are cached
+        (see COMPILED_CACHE_SIZE), so equal expressions are usually only
+        compiled once.
+        '''
+        return compileRegex(self)
+
 
 class Sigma(Production):
     def __init__(self, sigma):
@@ -30,11 +64,11 @@ class Sigma(Production):
     def matches(self, string):
         return self.sigma == string
 
-    def consume(self, string):
-        if len(string) >= 1 and string[0] == self.sigma:
-            return string[0:1], string[1:]
+    def consume_at(self, text, pos):
+        if pos < len(text) and text[pos] == self.sigma:
+            return pos + 1
         else:
-            return '', string
+            return pos
 
 
 class Repetition(Production):
@@ -53,16 +87,14 @@ class Repetition(Production):
 
         return self.expr.matches(string[0:1]) and self.matches(string[1:])
         
-    def consume(self, string):
-        consumed = 'default'
-        total_consumed = ''
-        leftover = string
+    def consume_at(self, text, pos):
+        end = self.expr.consume_at(text, pos)
 
-        while consumed != '':
-            consumed, leftover = self.expr.consume(leftover)
-            total_consumed += consumed
+        while end is not None and end != pos:
+            pos = end
+            end = self.expr.consume_at(text, pos)
 
-        return total_consumed, leftover
+        return pos
         
 
 class Alternative(Production):
@@ -81,18 +113,17 @@ class Alternative(Production):
         return self.left.matches(string) or \
                self.right.matches(string)
 
-    def consume(self, string):
-        left_consume, leftover = self.left.consume(string)
-        # he he he. rightover.... I crack myself up.
-        right_consume, rightover = self.right.consume(string)
+    def consume_at(self, text, pos):
+        left_end = self.left.consume_at(text, pos)
+        right_end = self.right.consume_at(text, pos)
 
         # This could be a potential problem due to there
         # being multiple parses include the left or right
         # side... We'll go with the longer parse for now
-        if len(left_consume) >= len(right_consume):
-            return left_consume, leftover
+        if right_end is None or (left_end is not None and left_end >= right_end):
+            return left_end
         else:
-            return right_consume, rightover
+            return right_end
             
 
 class Concatenation(Production):
@@ -110,16 +141,15 @@ class Concatenation(Production):
     def matches(self, string):
         return self.left.matches(string[0:1]) and self.right.matches(string[1:])
     
-    def consume(self, string):
-        left_match, leftover = self.left.consume(string)
-        right_match, leftover = self.right.consume(leftover)
+    def consume_at(self, text, pos):
+        left_end = self.left.consume_at(text, pos)
+
+        if left_end is None or left_end == pos:
+            return pos
 
-        if left_match == '':
-            return '', string
- 
-        left_match += right_match
+        right_end = self.right.consume_at(text, left_end)
 
-        return ''.join(left_match), leftover
+        return left_end if right_end is None else right_end
 
 class NilExpression(Production):
     def __str__(self):
@@ -135,8 +165,8 @@ class NilExpression(Production):
     def matches(self, string):
         return string == ''
 
-    def consume(self, string):
-        return '', string
+    def consume_at(self, text, pos):
+        return pos
 
 
 class Empty(Production):
@@ -152,8 +182,119 @@ class Empty(Production):
     def matches(self, string):
         return False
 
-    def consume(self, string):
-        return None, string
+    def consume_at(self, text, pos):
+        return None
+
+
+class CompiledRegex:
+    '''
+    A regular expression compiled to a DFA with a flat transition table.
+    '''
+
+    def __init__(self, dfa):
+        '''
+        :param Automata dfa: The DFA to build the transition table from.
+        '''
+        self.dfa = DenseAutomata.fromAutomata(dfa)
+
+        self.empty = not any(self.dfa.accepting)
+        '''Indicates that the expression can never match.'''
+
+    def matches(self, string):
+        '''Indicates whether the whole string matches this expression.'''
+        dfa = self.dfa
+        table, symbols, width = dfa.table, dfa.symbolIndex, len(dfa.symbols)
+        state = dfa.start
+
+        for symbol in string:
+            column = symbols.get(symbol)
+            if column is None:
+                return False
+            state = table[state * width + column]
+            if state == DenseAutomata.DEAD:
+                return False
+
+        return bool(dfa.accepting[state])
+
+    def consume_at(self, text, pos):
+        '''
+        Returns the offset one past the end of the longest match of this
+        expression starting at pos (pos if nothing was matched), or None if
+        this expression can never match, like Production.consume_at.
+        '''
+        if self.empty:
+            return None
+
+        dfa = self.dfa
+        table, symbols, width = dfa.table, dfa.symbolIndex, len(dfa.symbols)
+        state = dfa.start
+        end = pos
+
+        while pos < len(text):
+            column = symbols.get(text[pos])
+            if column is None:
+                break
+            state = table[state * width + column]
+            if state == DenseAutomata.DEAD:
+                break
+            pos += 1
+            if dfa.accepting[state]:
+                end = pos
+
+        return end
+
+
+COMPILED_CACHE_SIZE = 256
+"""The most compiled regexes compileRegex keeps."""
+
+_compiled = OrderedDict()
+"""Compiled regexes by canonical string, least recently used first."""
+
+
+def compileRegex(regex):
+    """ Compiles a regex tree into a CompiledRegex, reusing an earlier
+        compilation of an equal regex if it is still cached.
+
+        :param Production regex: The regex to compile.
+        :rtype: CompiledRegex
+    """
+    key = canonicalString(regex)
+    compiled = _compiled.pop(key, None)
+    if compiled is None:
+        # Imported here, as the automata modules themselves depend on this one.
+        from thompsons_construction import convertRegexToNFA
+        from subset_construction import convertNfaToDfa
+        from hopcrofts_algorithm import hopcroftMinimize
+
+        dfa = hopcroftMinimize(convertNfaToDfa(convertRegexToNFA(regex)))
+        compiled = CompiledRegex(dfa)
+        while len(_compiled) >= COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+
+    _compiled[key] = compiled
+    return compiled
+
+
+def canonicalString(regex):
+    """ Renders a regex tree in prefix notation like str() does, but with
+        every symbol quoted as in a lexical description, so that symbols such
+        as '+' or ' ' can't be mistaken for operators or separators.
+
+        :param Production regex: The regex to render.
+        :rtype: str
+    """
+    if isinstance(regex, Sigma):
+        return "'" + regex.sigma
+    elif isinstance(regex, Repetition):
+        return '* ' + canonicalString(regex.expr)
+    elif isinstance(regex, Alternative):
+        return '| ' + canonicalString(regex.left) + ' ' + \
+               canonicalString(regex.right)
+    elif isinstance(regex, Concatenation):
+        return '+ ' + canonicalString(regex.left) + ' ' + \
+               canonicalString(regex.right)
+    else:
+        return str(regex)
 
 
 def BuildExpression(tokens):
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+from automata import *
+from regex import *
+
+
+class RegexBuilder:
+    """Base class of the builders that turn regular expression trees into
+       NFAs (see thompsons_construction and glushkov_construction). build walks
+       a tree and calls the builder's construct methods on each node, and
+       assemble creates the Automata once every tree has been built.
+
+       Subclasses define what a built node is, and these methods to make one:
+       constructCharacter(character), constructEpsilon(), constructEmpty(),
+       constructRepetition(inner), constructAlternative(left, right) and
+       constructConcatenation(left, right), where inner, left and right are
+       the built children of the node."""
+
+    def build(self, regex):
+        """Builds a regular expression tree. The tree is walked in post-order
+           with an explicit stack, so there is no limit on its depth.
+
+           :param Production regex: The regular expression tree.
+           :return: The built tree, as returned by the construct method of its
+                    root.
+        """
+        # work holds nodes still to be visited, paired with whether their
+        # children have been built yet. Built nodes are kept on built, the
+        # right child on top of the left.
+        work, built = [(regex, False)], []
+        while work:
+            node, childrenBuilt = work.pop()
+            if isinstance(node, Sigma):
+                built.append(self.constructCharacter(node.sigma))
+            elif isinstance(node, NilExpression):
+                built.append(self.constructEpsilon())
+            elif isinstance(node, Empty):
+                built.append(self.constructEmpty())
+            elif not childrenBuilt:
+                work.append((node, True))
+                if isinstance(node, Repetition):
+                    work.append((node.expr, False))
+                else:
+                    work.append((node.right, False))
+                    work.append((node.left, False))
+            elif isinstance(node, Repetition):
+                built.append(self.constructRepetition(built.pop()))
+            else:
+                right, left = built.pop(), built.pop()
+                if isinstance(node, Alternative):
+                    built.append(self.constructAlternative(left, right))
+                else:
+                    built.append(self.constructConcatenation(left, right))
+
+        return built[0]
+
+    def assemble(self, stateCount, edges, start, accepts):
+        """Creates an Automata from numbered states, named s0, s1 and so on.
+
+           :param int stateCount: The number of states.
+           :param edges: (fromState, symbol, toState) triples, in order.
+           :param int start: The start state.
+           :param accepts: (state, tag) pairs of the accept states, in order,
+                           with a tag of None for untagged states.
+           :rtype: Automata
+        """
+        names = ['s' + str(i) for i in range(stateCount)]
+        nodes = [AutomataNode(name) for name in names]
+        transitions = []
+        for fromState, symbol, toState in edges:
+            nodes[fromState].addTransition(names[toState], symbol)
+            transitions.append([names[fromState], [symbol], names[toState]])
+
+        nfa = Automata()
+        nfa.addNodes(nodes)
+        nfa.start = names[start]
+        for accept, tag in accepts:
+            nfa.markAccepting(names[accept], tag)
+        nfa.alphabet = set(self.alphabet)
+        nfa.states = names
+        nfa.transitions = transitions
+
+        return nfa
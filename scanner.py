@@ -1,4 +1,13 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from multiprocessing import Pool, cpu_count
+from itertools import izip
+from automata import DenseAutomata
 from regex import BuildExpression
+from thompsons_construction import convertRegexListToNFA
+from subset_construction import convertNfaToDfa
+from hopcrofts_algorithm import hopcroftMinimize
+from lazy_dfa import LazyDfa
 
 class LexicalDesc:
     """Encapsulates a complete lexical description."""
@@ -13,8 +22,50 @@ class LexicalDesc:
         self.name = name
         self.alphabet = alphabet
         self.classes = [LexicalClass(c[0], c[1], c[2]) for c in classes]
+        self.scanner = None
 
-    def scan(self, string_to_scan, tokens=[]):
+    def compile(self):
+        """
+        Compiles every class of this description into a single minimized
+        DFA, built from one tagged NFA so that each accept state remembers
+        which class it recognizes. The result is cached, so this is only
+        done once.
+
+        :return the compiled Scanner for this description.
+        """
+        if self.scanner is None:
+            nfa = convertRegexListToNFA([c.regex for c in self.classes])
+            dfa = hopcroftMinimize(convertNfaToDfa(nfa))
+            self.scanner = Scanner(dfa, [(c.name, c.relevance)
+                                         for c in self.classes])
+        return self.scanner
+
+    def compile_to(self, path):
+        '''
+        Compiles this description and saves the scanner to a file, which
+        compiled_lexer.load_scanner can load without this description.
+
+        :param path the path of the file to write.
+        :return the compiled Scanner for this description.
+        '''
+        from compiled_lexer import save_scanner
+        scanner = self.compile()
+        save_scanner(scanner, path)
+        return scanner
+
+    def compile_lazy(self, cache_size=4096):
+        """
+        Like compile, but the scanner builds the states of the DFA only as
+        the input reaches them, keeping at most cache_size of them. Useful
+        when the full DFA would be too large to build.
+
+        :return a new LazyScanner for this description.
+        """
+        nfa = convertRegexListToNFA([c.regex for c in self.classes])
+        return LazyScanner(LazyDfa(nfa, cache_size),
+                           [(c.name, c.relevance) for c in self.classes])
+
+    def scan(self, string_to_scan):
         '''
         Scans a string and produces a list of Tokens parsed from
         the string.
@@ -23,35 +74,605 @@ class LexicalDesc:
                of Token objects.
         :return a list of Token object recognized by the string. If the
                 string cannot be fully recognized (ie, there is part of the
-                string left after scanning completely) an empty list will be
-                returned.
+                string left after scanning completely) a ScanError is
+                raised.
+        '''
+        return self.compile().scan(string_to_scan)
+
+    def tokenize(self, string_to_scan):
+        '''
+        Like scan, but yields the Tokens one at a time as they are found.
+        '''
+        return self.compile().tokenize(string_to_scan)
+
+    def scan_stream(self, string_to_scan):
+        '''
+        Like scan, but returns a compact TokenStream instead of a list of
+        Tokens.
+        '''
+        return self.compile().scan_stream(string_to_scan)
+
+    def iter_tokens(self, source, chunk_size=65536):
+        '''
+        Like tokenize, but lazily reads the input from a file object or an
+        iterable of string chunks. Tokens may straddle chunk boundaries.
+        '''
+        return self.compile().iter_tokens(source, chunk_size)
+
+    def rescan(self, string, tokens, offset, deleted, inserted):
+        '''
+        Updates the tokens of a string after an edit, only scanning the part
+        of the string the edit can have changed. See Scanner.rescan.
+        '''
+        return self.compile().rescan(string, tokens, offset, deleted, inserted)
+
+    def scan_files(self, paths, workers=None, chunksize=1):
+        '''
+        Scans a list of files, optionally in parallel. See Scanner.scan_files.
+        '''
+        return self.compile().scan_files(paths, workers, chunksize)
+
+    def scan_parallel(self, string_to_scan, workers=None, chunks=None):
+        '''
+        Like scan, but splits the string into chunks scanned in parallel.
+        See Scanner.scan_parallel.
+        '''
+        return self.compile().scan_parallel(string_to_scan, workers, chunks)
+
+
+class Scanner:
+    """A compiled lexical description: a single DFA recognizing every class,
+       used to find maximal munch matches in one pass over the input."""
+
+    def __init__(self, dfa, classes):
+        """
+        :param dfa: A DFA whose accept states are tagged with class indices.
+                    It is kept in dense form, and may be given as a
+                    DenseAutomata already.
+        :param classes: A list of (name, relevance) pairs, indexed by tag.
+        """
+        if not isinstance(dfa, DenseAutomata):
+            dfa = DenseAutomata.fromAutomata(dfa)
+        self.dfa = dfa
+        self.classes = classes
+
+    def longest_match(self, string, pos):
+        '''
+        Runs the DFA from pos for as long as it can, remembering the last
+        accept state that was passed through.
+
+        :param string the string being scanned.
+        :param pos the offset in string to start matching at.
+        :return an (end, tag, stop) triple. end and tag describe the longest
+                non-empty match starting at pos, or are (pos, None) if no
+                class matches there. stop is the offset of the character the
+                DFA died on, or len(string) if it ran out of input first.
+        '''
+        return self.continue_match(string, pos, None, pos, None)[:3]
+
+    def continue_match(self, string, i, state, end, tag):
+        '''
+        Like longest_match, but carries on with a match that has already run
+        part of the way, so that a match can be resumed on more input.
+
+        :param string the string being scanned.
+        :param i the offset in string to carry on from.
+        :param state the DFA state the match has reached, or None to start a
+               new match at i.
+        :param end the end of the longest match so far.
+        :param tag the tag of the longest match so far, or None.
+        :return an (end, tag, stop, state) tuple. end, tag and stop are as
+                for longest_match, and state is the DFA state at stop.
+        '''
+        dfa = self.dfa
+        table, symbols, tags = dfa.table, dfa.symbolIndex, dfa.tags
+        width = len(dfa.symbols)
+        if state is None:
+            state = dfa.start
+
+        length = len(string)
+        while i < length:
+            column = symbols.get(string[i])
+            if column is None:
+                break
+            state = table[state * width + column]
+            if state == DenseAutomata.DEAD:
+                break
+            i += 1
+            if tags[state] != DenseAutomata.DEAD:
+                end, tag = i, tags[state]
+
+        return end, tag, i, state
+
+    def tokenize(self, string):
+        '''
+        Scans a string from left to right, yielding a Token for each
+        maximal munch match whose class is not discarded.
+
+        :param string the string to scan.
+        :raise ScanError if some part of the string matches no class.
+        '''
+        return self.__tokenize(string, 0, -1)
+
+    def __tokenize(self, string, pos, reach):
+        '''
+        Scans string from pos, which must be the start of a token, yielding
+        its Tokens. reach is the furthest offset examined before pos.
+        '''
+        length = len(string)
+        while pos < length:
+            end, tag, stop = self.longest_match(string, pos)
+
+            '''
+                No class matches here, so there is no logical parse
+                using the regexes we were given.
+            '''
+            if tag is None:
+                raise ScanError(string, pos)
+
+            name, relevance = self.classes[tag]
+            if relevance != 'discard':
+                yield Token(string[pos:end], name, relevance, pos, reach)
+            reach = max(reach, stop)
+            pos = end
+
+    def scan(self, string):
+        '''
+        Scans a string into a list of Tokens. See tokenize.
+        '''
+        tokens = list(self.tokenize(string))
+        _make_runs(tokens)
+        return tokens
+
+    def scan_stream(self, string):
+        '''
+        Scans a string into a TokenStream, which records each token as a
+        class id and a pair of offsets rather than as a Token object.
+
+        :param string the string to scan.
+        :raise ScanError if some part of the string matches no class.
+        '''
+        stream = TokenStream(string, self.classes)
+        ids, starts, ends = stream.ids, stream.starts, stream.ends
+        discard = [relevance == 'discard' for name, relevance in self.classes]
+
+        pos, length = 0, len(string)
+        while pos < length:
+            end, tag, stop = self.longest_match(string, pos)
+            if tag is None:
+                raise ScanError(string, pos)
+            if not discard[tag]:
+                ids.append(tag)
+                starts.append(pos)
+                ends.append(end)
+            pos = end
+
+        return stream
+
+    def iter_tokens(self, source, chunk_size=65536):
+        '''
+        Like tokenize, but reads its input lazily, so only the current
+        chunk and any token in progress are held in memory.
+
+        :param source a file object (anything with a read method) or an
+               iterable of string chunks.
+        :param chunk_size the number of characters to read from a file
+               object at a time.
+        :raise ScanError if some part of the input matches no class. The
+               offset, line and column are relative to the whole input.
+        '''
+        if hasattr(source, 'read'):
+            chunks = _read_chunks(source, chunk_size)
+        else:
+            chunks = iter(source)
+
+        # buf holds the unscanned input; base, line and column locate buf[0]
+        # in the whole input.
+        buf, pos, eof = '', 0, False
+        base, line, column, reach = 0, 1, 1, -1
+
+        # When buf runs out in the middle of a match, the match carries on
+        # into the next chunk from the DFA state it had reached, instead of
+        # starting over. held keeps the token's text from earlier chunks, and
+        # end stays relative to the current chunk, so it is negative while
+        # the longest match so far ends in held text.
+        held, state, i, end, tag = [], None, 0, 0, None
+
+        while not (eof and pos == len(buf) and not held):
+            if state is None:
+                i, end, tag = pos, pos, None
+            end, tag, stop, state = self.continue_match(buf, i, state, end,
+                                                        tag)
+
+            # The DFA ran out of input while it could still keep going, so the
+            # longest match may continue into the next chunk. Drop what has
+            # been scanned before the token and read more before deciding.
+            if stop == len(buf) and not eof:
+                if not held:
+                    scanned = buf[:pos]
+                    newlines = scanned.count('\n')
+                    if newlines:
+                        line += newlines
+                        column = pos - scanned.rfind('\n')
+                    else:
+                        column += pos
+                    base += pos
+                held.append(buf[pos:])
+                end -= len(buf)
+
+                chunk = next(chunks, None)
+                if chunk is None:
+                    chunk, eof = '', True
+                buf, pos, i = chunk, 0, 0
+                continue
+
+            if held:
+                # Put the token back together, so buf starts with it again.
+                text = ''.join(held)
+                buf, end, stop = text + buf, end + len(text), stop + len(text)
+                held = []
+            state = None
+
+            if tag is None:
+                raise ScanError(buf, pos, base, line, column)
+
+            name, relevance = self.classes[tag]
+            if relevance != 'discard':
+                yield Token(buf[pos:end], name, relevance, base + pos, reach)
+            reach = max(reach, base + stop)
+            pos = end
+
+    def rescan(self, string, tokens, offset, deleted, inserted):
+        '''
+        Updates the tokens of a string after an edit, without scanning the
+        whole string again. Scanning restarts at the last token the edit
+        can't have affected, which is the last one the scanner hadn't looked
+        past the edit before reaching, and stops as soon as it reaches the
+        start of one of the old tokens after the edit, from which point on
+        the old tokens are still valid.
+
+        :param string the string before the edit.
+        :param tokens the Tokens of string, as produced by scan. The list is
+               updated in place, and the Tokens after the edit are reused
+               with their offsets moved. Their TokenRuns are moved as a
+               whole, so Python-level work after the edit grows with the
+               number of runs rather than the number of Tokens. An edit is
+               still linear in the size of the input overall, as the edited
+               string is built by concatenation and the list is spliced.
+        :param offset the offset in string the edit starts at.
+        :param deleted the number of characters the edit removed.
+        :param inserted the text the edit inserted at offset.
+        :return tokens, and the edited string, as a (tokens, string) pair.
+        :raise ScanError if some part of the edited string matches no class.
+               tokens is left as it was.
+        '''
+        edited = string[:offset] + inserted + string[offset + deleted:]
+        shift = len(inserted) - deleted
+        edit_end = offset + len(inserted)
+
+        # Each Token's reach is the furthest offset examined before it, and
+        # never decreases along the list, so the restart point can be found by
+        # bisection.
+        first = bisect_right(KeyView(tokens, 'reach'), offset - 1) - 1
+        if first < 0:
+            first, pos, reach = 0, 0, -1
+        else:
+            pos, reach = tokens[first].offset, tokens[first].reach
+
+        starts = KeyView(tokens, 'offset')
+        scanned, length = [], len(edited)
+        last = len(tokens)
+        while pos < length:
+            # Once scanning reaches the start of an old token past the edit,
+            # the rest of the old tokens are unchanged.
+            if pos >= edit_end:
+                old = bisect_left(starts, pos - shift, first)
+                if old < len(tokens) and tokens[old].offset == pos - shift:
+                    last = old
+                    break
+
+            end, tag, stop = self.longest_match(edited, pos)
+            if tag is None:
+                raise ScanError(edited, pos)
+
+            name, relevance = self.classes[tag]
+            if relevance != 'discard':
+                scanned.append(Token(edited[pos:end], name, relevance, pos,
+                                     reach))
+            reach = max(reach, stop)
+            pos = end
+
+        # The runs holding the old tokens either side of the new ones are
+        # regrouped along with them. Every later run is moved by its delta
+        # alone, so the Tokens in it aren't touched.
+        run = tokens[first].run if tokens else None
+        regroup_start = first
+        while regroup_start > 0 and run is not None and \
+              tokens[regroup_start - 1].run is run:
+            regroup_start -= 1
+        run = tokens[last].run if last < len(tokens) else None
+        regroup_end = last
+        while regroup_end < len(tokens) and run is not None and \
+              tokens[regroup_end].run is run:
+            regroup_end += 1
+
+        # The reach of the old tokens may have been made by tokens that were
+        # replaced, so it is only kept if the new tokens didn't go further.
+        for token in tokens[last:regroup_end]:
+            token.offset += shift
+            token.reach = max(reach, token.reach + shift)
+
+        i = regroup_end
+        while i < len(tokens):
+            run = tokens[i].run
+            run_end = i + run.size if run is not None else i
+            if run is None or run_end > len(tokens) or \
+               tokens[run_end - 1].run is not run or \
+               (run_end < len(tokens) and tokens[run_end].run is run):
+                # The list wasn't made by scan or rescan, so group the rest
+                # of it first.
+                _make_runs(tokens[i:])
+                continue
+            run.delta += shift
+            i = run_end
+
+        # Reach never decreases along the list, so only the tokens up to the
+        # first that reaches as far as the new ones can need it raised.
+        i = regroup_end
+        while i < len(tokens) and tokens[i].reach < reach:
+            tokens[i].reach = reach
+            i += 1
+
+        regrouped = tokens[regroup_start:first] + scanned + \
+                    tokens[last:regroup_end]
+        _make_runs(regrouped)
+        tokens[regroup_start:regroup_end] = regrouped
+        return tokens, edited
+
+    def scan_files(self, paths, workers=None, chunksize=1):
+        '''
+        Scans each of a list of files into a list of Tokens.
+
+        :param paths the paths of the files to scan.
+        :param workers if more than one, the files are scanned across a pool
+               of this many worker processes, each sent this scanner once and
+               the paths in chunks.
+        :param chunksize the number of paths sent to a worker at a time.
+        :return a list with, in the order of paths, either the Tokens of each
+                file, or the ScanError or EnvironmentError raised while
+                reading or scanning it.
         '''
-        if string_to_scan == '':
-            return tokens
+        if workers is None or workers <= 1:
+            return [_scan_file(self, path) for path in paths]
+
+        pool = Pool(workers, _init_worker, (self,))
+        try:
+            return pool.map(_worker_scan_file, paths, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    def scan_parallel(self, string, workers=None, chunks=None):
+        '''
+        Scans a string into a list of Tokens, like scan, across a pool of
+        worker processes.
+
+        The string is split into chunks, each starting after a newline where
+        possible, and every chunk is scanned speculatively by a worker as if
+        a token started at its beginning. The chunks are then stitched
+        together in order: the scan of a chunk is used from the first of its
+        tokens that starts where the scan of the chunk before it left off,
+        since the scanner always begins a token in the same state. If there
+        is no such token, the string is scanned sequentially from there until
+        it lines up with the chunk's tokens or reaches the next chunk.
+
+        :param string the string to scan.
+        :param workers the number of worker processes, by default one per
+               CPU. The string is simply scanned if this is one.
+        :param chunks the number of chunks to split the string into, by
+               default one per worker.
+        :raise ScanError if some part of the string matches no class.
+        '''
+        if workers is None:
+            workers = cpu_count()
+        if chunks is None:
+            chunks = workers
+        starts = _split_points(string, chunks)
+        if workers <= 1 or len(starts) <= 1:
+            return self.scan(string)
+
+        limits = starts[1:] + [len(string)]
+        pool = Pool(workers, _init_chunk_worker, (self, string))
+        try:
+            results = pool.map(_worker_scan_chunk, zip(starts, limits), 1)
+        finally:
+            pool.close()
+            pool.join()
 
+        tokens, reach, pos = [], -1, 0
+        for limit, (spans, chunk_end, failed) in zip(limits, results):
+            spans = array('l', spans)
+            chunk_starts = spans[0::4]
+            while pos < limit:
+                first = bisect_left(chunk_starts, pos)
+                if first < len(chunk_starts) and chunk_starts[first] == pos:
+                    # Lined up with the chunk's tokens, so use the rest of
+                    # them.
+                    i = 4 * first
+                    reach = self.__span_tokens(string, spans[i::4],
+                                               spans[i + 1::4], spans[i + 2::4],
+                                               spans[i + 3::4], reach, tokens)
+                    pos = chunk_end
+                    if failed:
+                        raise ScanError(string, pos)
+                    break
+
+                end, tag, stop = self.longest_match(string, pos)
+                if tag is None:
+                    raise ScanError(string, pos)
+                reach = self.__span_tokens(string, [pos], [end], [tag], [stop],
+                                           reach, tokens)
+                pos = end
+
+        _make_runs(tokens)
+        return tokens
+
+    def __span_tokens(self, string, starts, ends, tags, stops, reach, tokens):
         '''
-           Represents the leftmost parse of the parse tree.
+        Appends the Tokens for a run of matches, given as parallel sequences
+        of their starts, ends, tags and stops, to tokens, leaving out those
+        of discarded classes. Returns the scanner's reach after them.
         '''
-        for c in self.classes:
-            matched, leftover = c.regex.consume(string_to_scan)
+        classes, append = self.classes, tokens.append
+        for start, end, tag, stop in izip(starts, ends, tags, stops):
+            name, relevance = classes[tag]
+            if relevance != 'discard':
+                append(Token(string[start:end], name, relevance, start, reach))
+            if stop > reach:
+                reach = stop
+        return reach
+
+
+def _split_points(string, chunks):
+    """Returns the offsets to split string into about chunks parts at, each
+       moved to just after the next newline if there is one in its part."""
+    length = len(string)
+    starts = [0]
+    for i in range(1, chunks):
+        nominal = length * i // chunks
+        newline = string.find('\n', nominal, length * (i + 1) // chunks)
+        start = nominal if newline == -1 else newline + 1
+        if starts[-1] < start < length:
+            starts.append(start)
+    return starts
+
+
+def _scan_chunk(scanner, string, pos, limit):
+    """
+    Scans string from pos as if a token started there, until reaching a token
+    start at or past limit. Returns the matches as a flat array of (start,
+    end, tag, stop) entries in string form, including those of discarded
+    classes, the offset scanning stopped at, and whether it stopped because
+    no class matched there.
+    """
+    spans = array('l')
+    while pos < limit:
+        end, tag, stop = scanner.longest_match(string, pos)
+        if tag is None:
+            return spans.tostring(), pos, True
+        spans.extend((pos, end, tag, stop))
+        pos = end
+    return spans.tostring(), pos, False
+
+
+# The scanner and string each chunk worker scans, set once per worker. On
+# platforms that fork, the string is shared with the workers without copying.
+_chunk_scanner = None
+_chunk_string = None
+
+
+def _init_chunk_worker(scanner, string):
+    global _chunk_scanner, _chunk_string
+    _chunk_scanner, _chunk_string = scanner, string
 
-            #if we do get a match using the regex
-            if matched != '':
-                if c.relevance != 'discard':
-                    new_tokens = tokens + [Token(matched, c.name, c.relevance)]
-                else:
-                    new_tokens = tokens
-                try:
-                    return self.scan(leftover, new_tokens)
-                except Exception as e:
-                    continue
 
-        ''' 
-            If we get here, that means there was no logical parse
-            using the regexes we were given. We should return an error
-            at this point. 
+def _worker_scan_chunk(bounds):
+    return _scan_chunk(_chunk_scanner, _chunk_string, bounds[0], bounds[1])
+
+
+def _scan_file(scanner, path):
+    """Scans a file, returning its Tokens or the error that stopped it."""
+    try:
+        with open(path) as f:
+            return scanner.scan(f.read())
+    except (ScanError, EnvironmentError) as e:
+        return e
+
+
+# The scanner each pool worker scans files with, set once per worker.
+_worker_scanner = None
+
+
+def _init_worker(scanner):
+    global _worker_scanner
+    _worker_scanner = scanner
+
+
+def _worker_scan_file(path):
+    return _scan_file(_worker_scanner, path)
+
+
+def _read_chunks(fileobj, chunk_size):
+    """Yields chunks read from fileobj until it is exhausted."""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class LazyScanner(Scanner):
+    """A scanner running on a LazyDfa instead of a fully built DFA."""
+
+    def __init__(self, dfa, classes):
+        """
+        :param dfa: A LazyDfa whose NFA accept states are tagged with class
+                    indices.
+        :param classes: A list of (name, relevance) pairs, indexed by tag.
+        """
+        self.dfa = dfa
+        self.classes = classes
+
+    def longest_match(self, string, pos):
+        '''
+        See Scanner.longest_match.
         '''
-        raise Exception(string_to_scan)
+        return self.dfa.longest_match(string, pos)
+
+    def continue_match(self, string, i, state, end, tag):
+        '''
+        See Scanner.continue_match. States are LazyDfa masks.
+        '''
+        return self.dfa.continue_match(string, i, state, end, tag)
+
+
+class ScanError(Exception):
+    """Raised when part of the input can't be matched by any lexical class."""
+
+    def __init__(self, string, offset, base=0, line=1, column=1):
+        """
+        :param string: The string being scanned.
+        :param offset: The offset in string where scanning failed.
+        :param base: The offset of string within the whole input, if string
+                     is only part of it.
+        :param line: The line string starts on within the whole input.
+        :param column: The column string starts on within the whole input.
+        """
+        newlines = string.count('\n', 0, offset)
+        self.offset = base + offset
+        self.line = line + newlines
+        if newlines:
+            self.column = offset - string.rfind('\n', 0, offset)
+        else:
+            self.column = column + offset
+        Exception.__init__(self, "No lexical class matches at line " + \
+                           str(self.line) + ", column " + str(self.column) + \
+                           " (offset " + str(self.offset) + "): " + \
+                           repr(string[offset:offset + 20]))
+
+    def __reduce__(self):
+        # Pickle the position rather than the (possibly huge) scanned string,
+        # so errors can be sent back from worker processes.
+        return _restore_scan_error, (self.args[0], self.offset, self.line,
+                                     self.column)
+
+
+def _restore_scan_error(message, offset, line, column):
+    """Rebuilds a pickled ScanError."""
+    error = ScanError.__new__(ScanError)
+    Exception.__init__(error, message)
+    error.offset, error.line, error.column = offset, line, column
+    return error
 
 
 class LexicalClass:
@@ -67,21 +688,166 @@ class LexicalClass:
         self.regex, ignored = BuildExpression(class_tokens)
         self.relevance = relevance
 
+    def matches(self, string):
+        """Indicates whether the whole string is in this class, using the
+           cached compiled form of the class regex."""
+        return self.regex.compile().matches(string)
+
     def __str__(self):
         return "Name: " + self.name + ", Regex: " + \
                str(self.regex) + ", Relevance: " + self.relevance
 
 
-class Token:
+class TokenStream:
+    '''The tokens of a string, stored column-wise: parallel arrays of the
+       class id, start offset and end offset of each token, with the classes
+       in a table shared by every token. Indexing or iterating over a stream
+       creates Token objects on demand.'''
+
+    def __init__(self, string, classes):
+        '''
+        :param string the scanned string.
+        :param classes a list of (name, relevance) pairs, indexed by class id.
+        '''
+        self.string = string
+        self.classes = classes
+
+        self.ids = array('i')
+        '''The class id of each token.'''
+
+        self.starts = array('l')
+        '''The offset of each token in string.'''
+
+        self.ends = array('l')
+        '''The offset just past each token in string.'''
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        '''
+        Returns the Token at index, or a TokenStream for a slice. Tokens made
+        from a stream don't have a reach, so they can't be used with rescan.
+        '''
+        if isinstance(index, slice):
+            stream = TokenStream(self.string, self.classes)
+            stream.ids = self.ids[index]
+            stream.starts = self.starts[index]
+            stream.ends = self.ends[index]
+            return stream
+
+        start = self.starts[index]
+        name, relevance = self.classes[self.ids[index]]
+        return Token(self.string[start:self.ends[index]], name, relevance,
+                     start)
+
+    def __iter__(self):
+        string, classes = self.string, self.classes
+        for class_id, start, end in izip(self.ids, self.starts, self.ends):
+            name, relevance = classes[class_id]
+            yield Token(string[start:end], name, relevance, start)
+
+    def text(self, index):
+        '''Returns the text of the token at index.'''
+        return self.string[self.starts[index]:self.ends[index]]
+
+    def with_relevance(self, *relevances):
+        '''
+        Returns a TokenStream of only the tokens whose class has one of the
+        given relevances, such as 'relevant'.
+        '''
+        wanted = [relevance in relevances for name, relevance in self.classes]
+        keep = [i for i, class_id in enumerate(self.ids) if wanted[class_id]]
+
+        stream = TokenStream(self.string, self.classes)
+        stream.ids = array('i', [self.ids[i] for i in keep])
+        stream.starts = array('l', [self.starts[i] for i in keep])
+        stream.ends = array('l', [self.ends[i] for i in keep])
+        return stream
+
+
+class KeyView:
+    '''A read-only view of one attribute of every item in a list, so that
+       the list can be searched with the bisect module.'''
+
+    def __init__(self, items, attribute):
+        self.items = items
+        self.attribute = attribute
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return getattr(self.items[index], self.attribute)
+
+
+class TokenRun:
+    '''A run of consecutive Tokens in a list, whose offsets and reaches are
+       stored relative to a shared delta. Scanner.rescan moves every Token in
+       a run by changing the delta once.'''
+
+    SIZE = 512
+    """The most Tokens put in one run."""
+
+    def __init__(self, size):
+        self.delta = 0
+        self.size = size
+        '''The number of Tokens in the run.'''
+
+
+def _make_runs(tokens):
+    """Puts a list of consecutive Tokens into new TokenRuns."""
+    for start in range(0, len(tokens), TokenRun.SIZE):
+        run = TokenRun(min(TokenRun.SIZE, len(tokens) - start))
+        for token in tokens[start:start + run.size]:
+            # The new run's delta is 0, so a Token joins it with its absolute
+            # offset and reach, which it already holds if it had no run.
+            if token.run is not None:
+                token._offset, token._reach = token.offset, token.reach
+            token.run = run
+
+
+class Token(object):
     '''Essentially a tuple of a String, LexicalClass, and a relevance as
        defined in the lexical desciption of the grammar
     '''
 
-    def __init__(self, string, lex_class_name, relevance):
+    def __init__(self, string, lex_class_name, relevance, offset=None,
+                 reach=None):
         self.string = string
         self.lexical_class = lex_class_name
         self.relevance = relevance
 
+        self.run = None
+        '''The TokenRun the token's offset and reach are relative to, if
+           any.'''
+
+        self._offset = offset
+        self._reach = reach
+
+    @property
+    def offset(self):
+        '''The offset of the token in the scanned input.'''
+        if self.run is None:
+            return self._offset
+        return self._offset + self.run.delta
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = offset if self.run is None else offset - self.run.delta
+
+    @property
+    def reach(self):
+        '''The furthest offset the scanner examined before reaching this
+           token, used by Scanner.rescan.'''
+        if self.run is None:
+            return self._reach
+        return self._reach + self.run.delta
+
+    @reach.setter
+    def reach(self, reach):
+        self._reach = reach if self.run is None else reach - self.run.delta
+
     def __str__(self):
         return "Class: " + str(self.lexical_class) + "\n\tString: "\
                + str(self.string) + '\n'
@@ -11,27 +11,18 @@ def epsilonClosure(state, visitedStates, nfa):
         transition. This function can traverse over multiple epsilon transitions
         and thus can return states further than one transition.
 
+        The closure is looked up in the NFA's precomputed tables (see
+        getNfaTables), so no traversal is done here.
+
         :param AutomataNode state: Initial state.
         :param set[AutomataNode] visitedStates: Set of states already visited.
+                                                The closure is added to it.
         :param Automata nfa: The automaton that state belongs to.
         :rtype: set[AutomataNode]
     """
-    # Stores all states that can be reached via epsilon transition from this state.
-    reachableStates = set()     
-    # A state can always reach itself via epsilon transition.
-    reachableStates.add(state)  
-    # Visit this node so that further recursion doesn't re-add these transitions.
-    visitedStates.add(state)    
-
-    # For each state reachable by epsilon transition that has not ben visited yet,
-    # calculate the epsilon closure of that state and add it to the 
-    # reachableStates set.
-    if EPSILON in state.transitions:
-        for nextState in state.transitions[EPSILON]:
-            if nfa.nodes[nextState] not in visitedStates:
-                # Set data structure automatically discards duplicates.
-                reachableStates |= epsilonClosure(nfa.nodes[nextState], \
-                                                  visitedStates, nfa)
+    tables = getNfaTables(nfa)
+    reachableStates = set(tables.maskNodes(tables.closures[tables.bit[state.name]]))
+    visitedStates |= reachableStates
 
     return reachableStates
 
@@ -59,7 +50,8 @@ def move(states, symbol, nfa):
 
 def convertNfaToDfa(nfa):
     """ Converts an NFA into a DFA via epsilon closure and subset construction.
-        This code is based off of this pseudocode:
+        Sets of NFA states are represented as integer bitmasks while the DFA
+        is being built. This code is based off of this pseudocode:
 
         =============================================================
         D-States = EpsilonClosure(NFA Start State) and it is unmarked
@@ -82,81 +74,235 @@ def convertNfaToDfa(nfa):
         :rtype: Automata
     """
 
-    # The DFA being constructed.
+    # Sets of NFA states are encoded as integer bitmasks, with bit i standing
+    # for tables.nodes[i]. DFA states are keyed on these masks, and only given
+    # names once construction is finished.
+    tables = getNfaTables(nfa)
+    successors = tables.successors
+
+    # dfaStates[i] is the mask of the i'th DFA state, dfaIndex is its inverse,
+    # and dfaTransitions[i] maps each symbol to the index of the next state.
+    # States at or past the marked index have not been processed yet.
+    startMask = tables.start
+    dfaStates, dfaIndex, dfaTransitions = [startMask], {startMask: 0}, []
+
+    marked = 0
+    while marked < len(dfaStates):
+        # Gather the epsilon closures of the moves of every NFA state in this
+        # DFA state, per symbol.
+        closureMasks = {}
+        for i in maskBits(dfaStates[marked]):
+            for symbol, mask in successors[i].items():
+                closureMasks[symbol] = closureMasks.get(symbol, 0) | mask
+
+        # Add any new DFA states.
+        transitions = {}
+        for symbol, closureMask in closureMasks.items():
+            if closureMask not in dfaIndex:
+                dfaIndex[closureMask] = len(dfaStates)
+                dfaStates.append(closureMask)
+            transitions[symbol] = dfaIndex[closureMask]
+
+        dfaTransitions.append(transitions)
+        marked += 1
+
+    # Build the DFA, naming each state after the NFA states it encompasses.
     dfa = Automata()
-
-    # Maps new state names to the collection of states they encompass. During the
-    # construction of the new DFA, composite states such as {s0,s1,s2} can be
-    # created, which is itself just one state, but needs to point to each of
-    # the three states in the NFA it was constructed from.
-    nameToStates = dict()
-
-    # Sets to keep track of states that are waiting to be processed, and that
-    # have been processed.
-    markedStates = set()
-    unmarkedStates = set()
-
-    # Create initial DFA state from epsilon closure over NFA initial state.
-    initStateClosure = epsilonClosure(nfa.nodes[nfa.start], set(), nfa)
-    dfaInitState = AutomataNode(stateSetName(initStateClosure))
-
-    # Add the initial composite state to the new DFA, the unmarked list, and 
-    # the name map.
-    dfa.addNodes([dfaInitState])
-    dfa.start = dfaInitState.name
-    unmarkedStates.add(dfaInitState)
-    nameToStates[dfaInitState.name] = initStateClosure
-
-    while unmarkedStates:
-        # Mark the new state
-        state = unmarkedStates.pop()
-        markedStates.add(state)
-
-        # Generate set of states from epsilon closures over every state returned
-        # from this move.
-        for symbol in nfa.alphabet:
-            moveStates = move(nameToStates[state.name], symbol, nfa)
-
-            # Only proceed if move produced states. Empty set means we don't 
-            # bother with epsilon closures/new states.
-            if moveStates:
-                closureSet, visitedStates = set(), set()
-                for moveState in moveStates:
-                    closureSet |= epsilonClosure(moveState, visitedStates, nfa)
-
-                # Generate new DFA state from combined epsilon closures.
-                newDfaState = AutomataNode(stateSetName(closureSet))
-
-                # If this new state is actually new, add new state to DFA, the 
-                # unmarked list, and the name map.
-                if (newDfaState not in unmarkedStates) and \
-                   (newDfaState not in markedStates):
-                    dfa.addNodes([newDfaState])
-                    unmarkedStates.add(newDfaState)
-                    nameToStates[newDfaState.name] = closureSet.copy()
-
-                    # Add this node to the accept list if it is based off of an 
-                    # accept node.
-                    for node in closureSet:
-                        if node.accept:
-                            newDfaState.accept = True
-                            dfa.accepts.append(newDfaState.name)
-                            break
-
-                # Add the transition to this (new) state.
-                state.addTransition(newDfaState.name, symbol)
-
-    # Fill out the rest of the new DFA's metadata.
     dfa.alphabet = nfa.alphabet.copy()
-    dfa.states = dfa.nodes.keys()
-    for node in dfa.nodes.values():
-        for trans in node.transitions.keys():
-            for toState in node.transitions[trans]:
-                dfa.transitions.append([node.name, [trans], toState])
+    dfaNodes = []
+    for mask in dfaStates:
+        nfaStates = tables.maskNodes(mask)
+        node = AutomataNode(stateSetName(nfaStates))
+        node.accept = any(state.accept for state in nfaStates)
+        node.tag = stateSetTag(nfaStates)
+        dfaNodes.append(node)
+
+        if node.accept:
+            dfa.accepts.append(node.name)
+
+    dfa.addNodes(dfaNodes)
+    dfa.start = dfaNodes[0].name
+    for node, transitions in zip(dfaNodes, dfaTransitions):
+        for symbol, toState in transitions.items():
+            node.addTransition(dfaNodes[toState].name, symbol)
+            dfa.transitions.append([node.name, [symbol], dfaNodes[toState].name])
+    dfa.states = [node.name for node in dfaNodes]
 
     return dfa
 
 
+class NfaTables:
+    """ Precomputed bitmask tables for an NFA, used to simulate or determinize
+        it without chasing epsilon transitions. NFA states are numbered, and a
+        set of them is encoded as an integer with bit i set for state nodes[i].
+    """
+
+    def __init__(self, nfa):
+        """
+        :param Automata nfa: The NFA to build the tables for.
+        """
+        self.nodes = list(nfa.nodes.values())
+        """The NFA states, indexed by bit position."""
+
+        self.bit = {node.name: i for i, node in enumerate(self.nodes)}
+        """Dictionary mapping state names to bit positions."""
+
+        epsilons = [[self.bit[name] for name in node.transitions.get(EPSILON, [])]
+                    for node in self.nodes]
+
+        self.closures = epsilonClosureMasks(epsilons)
+        """The epsilon closure mask of each state."""
+
+        self.successors = []
+        """For each state, a dictionary mapping each symbol to the mask of the
+           epsilon closure of the states moved to on that symbol."""
+        for node in self.nodes:
+            successor = {}
+            for symbol, names in node.transitions.items():
+                if symbol != EPSILON:
+                    mask = 0
+                    for name in names:
+                        mask |= self.closures[self.bit[name]]
+                    successor[symbol] = mask
+            self.successors.append(successor)
+
+        self.start = 0
+        """The mask of the epsilon closure of the start state (or states, for
+           automata such as reversed ones that have a list of them)."""
+        starts = nfa.start if isinstance(nfa.start, list) else [nfa.start]
+        for start in starts:
+            self.start |= self.closures[self.bit[start]]
+
+        self.accepts = 0
+        """The mask of the accept states."""
+        for i, node in enumerate(self.nodes):
+            if node.accept:
+                self.accepts |= 1 << i
+
+    def maskNodes(self, mask):
+        """ Returns the states in a mask.
+
+            :param int mask: The mask to decode.
+            :rtype: list[AutomataNode]
+        """
+        return [self.nodes[i] for i in maskBits(mask)]
+
+    def step(self, mask, symbol):
+        """ Returns the mask of states reached from the states in mask on
+            symbol, including epsilon closures.
+
+            :param int mask: The states to move from.
+            :param str symbol: Input symbol over which to transition.
+            :rtype: int
+        """
+        successors, nextMask = self.successors, 0
+        for i in maskBits(mask):
+            nextMask |= successors[i].get(symbol, 0)
+        return nextMask
+
+
+def getNfaTables(nfa):
+    """ Returns the NfaTables of an NFA, building them the first time they are
+        needed. The tables are cached on the NFA until the NFA is changed
+        (see Automata.clearCaches).
+
+        :param Automata nfa: The NFA to get the tables for.
+        :rtype: NfaTables
+    """
+    if nfa.tables is None:
+        nfa.tables = NfaTables(nfa)
+    return nfa.tables
+
+
+def epsilonClosureMasks(epsilons):
+    """ Computes the epsilon closure of every state of an NFA at once. The
+        epsilon graph is condensed into its strongly connected components with
+        an iterative version of Tarjan's algorithm. Every state in a component
+        has the same closure, and components are completed in reverse
+        topological order, so each closure is the component itself plus the
+        already computed closures of the components it has edges to.
+
+        :param list[list[int]] epsilons: The epsilon successors of each state.
+        :rtype: list[int]
+    """
+    n = len(epsilons)
+    index, low, onStack = [None] * n, [0] * n, [False] * n
+    closures = [0] * n
+    stack, counter = [], 0
+
+    for root in range(n):
+        if index[root] is not None:
+            continue
+
+        work = [(root, 0)]
+        while work:
+            v, child = work[-1]
+            if child == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                onStack[v] = True
+
+            # Visit the next epsilon successor of v, if there is one.
+            if child < len(epsilons[v]):
+                work[-1] = (v, child + 1)
+                w = epsilons[v][child]
+                if index[w] is None:
+                    work.append((w, 0))
+                elif onStack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[v])
+
+            # v is the root of a component: pop it and compute its closure.
+            if low[v] == index[v]:
+                members, mask = [], 0
+                while True:
+                    w = stack.pop()
+                    onStack[w] = False
+                    members.append(w)
+                    mask |= 1 << w
+                    if w == v:
+                        break
+                for w in members:
+                    for x in epsilons[w]:
+                        mask |= closures[x]
+                for w in members:
+                    closures[w] = mask
+
+    return closures
+
+
+def maskBits(mask):
+    """ Returns the positions of the bits set in a bitmask, lowest first.
+
+        :param int mask: The bitmask to decode.
+        :rtype: list[int]
+    """
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+
+def stateSetTag(states):
+    """ Returns the highest priority (lowest) tag among a set of states, or None
+        if none of the states are tagged. Used to keep track of which lexical
+        class a composite DFA state accepts.
+
+        :param set[AutomataNode] states: The states to derive a tag from.
+        :rtype: int | None
+    """
+    tags = [state.tag for state in states if state.tag is not None]
+    return min(tags) if tags else None
+
+
 def stateSetName(states):
     """ Creates a name for a state derived from a supplied set of states. The 
         name is order-independent.
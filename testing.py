@@ -1,10 +1,20 @@
 from description_reader import *
 from hopcrofts_algorithm import hopcroftMinimize
 from brzozowski import convertNfaToMinDfa
-from thompsons_construction import convertRegexToNFA
+from thompsons_construction import convertRegexToNFA, convertRegexListToNFA, \
+    EPSILON
 from subset_construction import convertNfaToDfa
-from dfa_read import dfa_valid_string
-from scanner import LexicalDesc
+from dfa_read import dfa_valid_string, dfa_valid_strings, dfa_valid_array, \
+    nfa_valid_string
+from scanner import LexicalDesc, ScanError, TokenRun
+from compiled_lexer import load_scanner
+import description_cache
+import regex
+from description_cache import evict
+from automata import Automata, DenseAutomata
+from lazy_dfa import LazyDfa
+from equivalence import equivalent, includes, equivalenceCounterexample, \
+                        inclusionCounterexample
 
 
 def test_full_toolchain_0():
@@ -39,11 +49,11 @@ def test_full_toolchain_0():
     #lets use the most complex example now
     tiny_basic_scanner = ConstructLexicalDescription('./testdata/tiny_basic_lex_desc.txt')
     
-    # Read in a complicated example from the test files
-    basic_program = open('./testdata/tinyBasicProgram.txt').read()
+    # Stream in a complicated example from the test files
+    basic_program = open('./testdata/tinyBasicProgram.txt')
     
     try:
-        tiny_basic_scanner.scan(basic_program)
+        list(tiny_basic_scanner.iter_tokens(basic_program))
         test &= True
     except Exception:
         test &= False
@@ -101,8 +111,7 @@ def test_full_toolchain_2():
     lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
 
     # Step 3)
-    # 5 = whitespace
-    nfa = convertRegexToNFA(lex_desc.classes[4].regex)
+    nfa = convertRegexToNFA(lex_desc.classes[3].regex)  # 3 = Integer Arithmetic
 
     # Step 4)
     min_dfa = convertNfaToMinDfa(nfa)
@@ -119,6 +128,724 @@ def test_full_toolchain_2():
     else:
         print "Toolchain 2: Failure!"
 
+
+def test_compiled_scanner():
+    """ Tests that the compiled scanner takes the longest match across all
+        classes, rather than the first class that matches anything.
+    """
+    math_notation = ConstructLexicalDescription('./testdata/lexdesc2.txt')
+
+    tokens = math_notation.scan("123.123 12354*12356")
+    test = [t.lexical_class for t in tokens] == ['floatingPoint',
+                                                 'integerArithmatic']
+    test &= [t.string for t in tokens] == ['123.123', '12354*12356']
+
+    if test:
+        print "Compiled scanner: Success!"
+    else:
+        print "Compiled scanner: Failure!"
+
+
+def test_scan_error_position():
+    """ Tests that scanning errors report where in the input they happened,
+        and that long inputs don't run into the recursion limit.
+    """
+    tiny_basic_scanner = ConstructLexicalDescription('./testdata/tiny_basic_lex_desc.txt')
+    basic_program = open('./testdata/tinyBasicProgram.txt').read()
+
+    test = len(tiny_basic_scanner.scan(basic_program * 100)) == 5100
+
+    try:
+        tiny_basic_scanner.scan("10 LET X = 1\n20 let")
+        test &= False
+    except ScanError as e:
+        test &= (e.offset, e.line, e.column) == (16, 2, 4)
+
+    if test:
+        print "Scan errors: Success!"
+    else:
+        print "Scan errors: Failure!"
+
+
+def test_streaming_scanner():
+    """ Tests that scanning a file in small chunks, so that tokens straddle
+        chunk boundaries, gives the same tokens as scanning it all at once.
+    """
+    tiny_basic_scanner = ConstructLexicalDescription('./testdata/tiny_basic_lex_desc.txt')
+    basic_program = open('./testdata/tinyBasicProgram.txt').read()
+    expected = [(t.lexical_class, t.string)
+                for t in tiny_basic_scanner.scan(basic_program)]
+
+    test = True
+    for chunk_size in [1, 2, 3, 7, 1000]:
+        tokens = tiny_basic_scanner.iter_tokens(
+            open('./testdata/tinyBasicProgram.txt'), chunk_size)
+        test &= [(t.lexical_class, t.string) for t in tokens] == expected
+
+    try:
+        list(tiny_basic_scanner.iter_tokens(["10 LET X", " = 1\n20 l", "et"]))
+        test &= False
+    except ScanError as e:
+        test &= (e.offset, e.line, e.column) == (16, 2, 4)
+
+    # A long token read a character at a time is matched as it arrives, not
+    # from its start again after every chunk.
+    program = "10 LET X = " + "1" * 5000 + "\n20 END\n"
+    expected = [(t.lexical_class, t.string, t.offset)
+                for t in tiny_basic_scanner.scan(program)]
+    for scanner in [tiny_basic_scanner.compile(),
+                    tiny_basic_scanner.compile_lazy()]:
+        steps = [0]
+        def continue_match(string, i, state, end, tag,
+                           continue_match=scanner.continue_match):
+            result = continue_match(string, i, state, end, tag)
+            steps[0] += result[2] - i
+            return result
+        scanner.continue_match = continue_match
+        tokens = scanner.iter_tokens(iter(program))
+        test &= [(t.lexical_class, t.string, t.offset) for t in tokens] == \
+                expected
+        test &= steps[0] < 2 * len(program)
+        del scanner.continue_match
+
+    if test:
+        print "Streaming scanner: Success!"
+    else:
+        print "Streaming scanner: Failure!"
+
+
+def test_compiled_regex():
+    """ Tests that compiled regexes match the same strings as the DFAs they
+        are built from, and that equal regexes share one compilation.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    integer_arithmetic = lex_desc.classes[3]
+
+    test = integer_arithmetic.regex.compile() is \
+           ConstructLexicalDescription("testdata/lexdesc2.txt").classes[3].regex.compile()
+    test &= integer_arithmetic.matches("1+3")
+    test &= integer_arithmetic.matches("12354*12356")
+    test &= not integer_arithmetic.matches("1+3+")
+    test &= not integer_arithmetic.matches("1a3")
+    test &= not integer_arithmetic.matches("1")
+    test &= not lex_desc.classes[2].matches("1")
+    test &= lex_desc.classes[2].matches("1.5")
+    test &= lex_desc.classes[5].matches("")
+
+    # Only the most recently used compilations are kept.
+    cache_size = regex.COMPILED_CACHE_SIZE
+    try:
+        regex.COMPILED_CACHE_SIZE = 2
+        first = Sigma('a').compile()
+        for symbol in "bcd":
+            Sigma(symbol).compile()
+        test &= len(regex._compiled) == 2
+        test &= Sigma('d').compile() is Sigma('d').compile()
+        test &= Sigma('a').compile() is not first
+    finally:
+        regex.COMPILED_CACHE_SIZE = cache_size
+
+    if test:
+        print "Compiled regex: Success!"
+    else:
+        print "Compiled regex: Failure!"
+
+
+def test_dense_automata():
+    """ Tests that converting a DFA to its dense form and back loses nothing.
+    """
+    dfa = ConstructAutomata("testdata/dfa1.txt")
+    dense = DenseAutomata.fromAutomata(dfa)
+    round_trip = dense.toAutomata()
+
+    test = round_trip.start == dfa.start
+    test &= sorted(round_trip.accepts) == sorted(dfa.accepts)
+    test &= sorted(round_trip.nodes.keys()) == sorted(dfa.nodes.keys())
+    test &= round_trip.alphabet == dfa.alphabet
+    for name, node in dfa.nodes.items():
+        test &= round_trip.nodes[name].transitions == node.transitions
+    test &= dense.nextState(dense.start, 'a') == dense.names.index('blah2')
+    test &= dense.nextState(dense.start, 'b') == DenseAutomata.DEAD
+
+    if test:
+        print "Dense automata: Success!"
+    else:
+        print "Dense automata: Failure!"
+
+
+def test_hopcroft_minimize():
+    """ Tests that Hopcroft's algorithm merges equivalent states and keeps
+        the language of the DFA.
+    """
+    dfa = ConstructAutomata("testdata/dfa2.txt")
+    min_dfa = hopcroftMinimize(dfa)
+
+    # s5, s6 and s7 all accept every further string of a's.
+    test = sorted(min_dfa.nodes.keys()) == ['s1', 's2', 's3', 's4', 's5']
+    test &= min_dfa.accepts == ['s5']
+    for n in range(12):
+        test &= dfa_valid_string(min_dfa, "a" * n) == (n >= 4)
+
+    if test:
+        print "Hopcroft minimization: Success!"
+    else:
+        print "Hopcroft minimization: Failure!"
+
+
+def test_equivalence():
+    """ Tests that both minimization algorithms agree with the NFA they were
+        built from, and that counterexamples are found for different languages.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    integer = convertRegexToNFA(lex_desc.classes[1].regex)
+    arithmetic = convertRegexToNFA(lex_desc.classes[3].regex)
+
+    hopcroft = hopcroftMinimize(convertNfaToDfa(arithmetic))
+    brzozowski = convertNfaToMinDfa(arithmetic)
+
+    test = equivalent(hopcroft, brzozowski)
+    test &= equivalent(arithmetic, hopcroft)
+    test &= not equivalent(integer, arithmetic)
+    test &= equivalenceCounterexample(integer, arithmetic) in ['', '*', '+', '-', '/']
+    test &= not includes(integer, arithmetic)
+    test &= not includes(arithmetic, integer)
+    test &= inclusionCounterexample(arithmetic, integer) == ''
+
+    if test:
+        print "Equivalence: Success!"
+    else:
+        print "Equivalence: Failure!"
+
+
+def test_lazy_dfa():
+    """ Tests that lazily built DFAs give the same results as fully built
+        ones, even when the state cache is too small and keeps thrashing.
+    """
+    tiny_basic_scanner = ConstructLexicalDescription('./testdata/tiny_basic_lex_desc.txt')
+    basic_program = open('./testdata/tinyBasicProgram.txt').read()
+    expected = [(t.lexical_class, t.string)
+                for t in tiny_basic_scanner.scan(basic_program)]
+
+    test = True
+    for cache_size in [1, 4, 4096]:
+        lazy_scanner = tiny_basic_scanner.compile_lazy(cache_size)
+        tokens = lazy_scanner.scan(basic_program)
+        test &= [(t.lexical_class, t.string) for t in tokens] == expected
+        # Tokens are short, so only evictions counted across tokens show
+        # that the small caches are thrashing.
+        test &= lazy_scanner.dfa.thrashing() == (cache_size < 4096)
+
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    lazy_dfa = LazyDfa(convertRegexToNFA(lex_desc.classes[3].regex), 2)
+    test &= dfa_valid_string(lazy_dfa, "12354*12356")
+    test &= not dfa_valid_string(lazy_dfa, "1+3+")
+
+    if test:
+        print "Lazy DFA: Success!"
+    else:
+        print "Lazy DFA: Failure!"
+
+
+def test_nfa_simulation():
+    """ Tests validating strings directly against an NFA, without converting
+        it to a DFA first.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    nfa = convertRegexToNFA(lex_desc.classes[2].regex)  # 2 = Floating Point
+
+    test = nfa_valid_string(nfa, "123.123")
+    test &= nfa_valid_string(nfa, ".5")
+    test &= not nfa_valid_string(nfa, "123")
+    test &= not nfa_valid_string(nfa, "1.2.3")
+
+    # The NFA's tables, and a LazyDfa built from them, follow changes to it.
+    nfa = ConstructAutomata("testdata/nfa1.txt")
+    lazy_dfa = LazyDfa(nfa)
+    test &= not nfa_valid_string(nfa, "ab") and not lazy_dfa.matches("ab")
+    nfa.start = "blah2"
+    test &= nfa_valid_string(nfa, "ab") and lazy_dfa.matches("ab")
+    test &= not nfa_valid_string(nfa, "a") and not lazy_dfa.matches("a")
+    nfa.markAccepting("blah3")
+    test &= nfa_valid_string(nfa, "a") and lazy_dfa.matches("a")
+    test &= not nfa_valid_string(nfa, "c") and not lazy_dfa.matches("c")
+    nfa.nodes["blah2"].addTransition("blah4", "c")
+    test &= nfa_valid_string(nfa, "c") and lazy_dfa.matches("c")
+
+    if test:
+        print "NFA simulation: Success!"
+    else:
+        print "NFA simulation: Failure!"
+
+
+def test_batch_validation():
+    """ Tests validating long strings and batches of strings against a DFA,
+        both in this process and across a process pool.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    nfa = convertRegexToNFA(lex_desc.classes[3].regex)  # 3 = Integer Arithmetic
+    min_dfa = hopcroftMinimize(convertNfaToDfa(nfa))
+
+    test = dfa_valid_string(min_dfa, "1" * 5000 + "+2")
+
+    strings = ["1+3", "1-2", "3/4", "0*3", "1+3+", "13", ""] * 100
+    expected = [True, True, True, True, False, False, False] * 100
+    test &= dfa_valid_strings(min_dfa, strings) == expected
+    test &= dfa_valid_strings(min_dfa, strings, processes=2, chunksize=50) \
+            == expected
+
+    if test:
+        print "Batch validation: Success!"
+    else:
+        print "Batch validation: Failure!"
+
+
+def test_array_validation():
+    """ Tests validating an array of equal-length strings against a DFA with
+        NumPy, against validating them one at a time.
+    """
+    import numpy
+
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc2.txt")
+    nfa = convertRegexToNFA(lex_desc.classes[3].regex)  # 3 = Integer Arithmetic
+    min_dfa = hopcroftMinimize(convertNfaToDfa(nfa))
+
+    strings = ["1+3+4", "1-2*3", "1+3+a", "13+24", "12345", "0/0-0"] * 50
+    expected = dfa_valid_strings(min_dfa, strings)
+
+    test = list(dfa_valid_array(min_dfa, numpy.array(strings))) == expected
+    codes = numpy.array([[ord(c) for c in s] for s in strings])
+    test &= list(dfa_valid_array(min_dfa, codes)) == expected
+    test &= list(dfa_valid_array(min_dfa, numpy.array(strings, dtype='U'))) == expected
+    test &= len(dfa_valid_array(min_dfa, numpy.zeros((0, 5), dtype=int))) == 0
+    test &= len(dfa_valid_array(min_dfa, numpy.array([], dtype='S5'))) == 0
+
+    # Strings shorter than the array's width are checked at their own length.
+    mixed = ["1+3", "1+3+4", "1+", "", "12345"]
+    for dtype in ['S', 'U']:
+        test &= list(dfa_valid_array(min_dfa, numpy.array(mixed, dtype=dtype))) \
+                == dfa_valid_strings(min_dfa, mixed)
+    try:
+        dfa_valid_array(min_dfa, numpy.array([[ord("1"), -207]]))
+        test = False
+    except Exception:
+        pass
+    test &= True in expected and False in expected
+
+    if test:
+        print "Array validation: Success!"
+    else:
+        print "Array validation: Failure!"
+
+
+def test_compiled_lexer_file():
+    """ Tests saving a compiled scanner to a file and loading it back.
+    """
+    import os, struct, tempfile
+
+    lex_desc = ConstructLexicalDescription("testdata/tiny_basic_lex_desc.txt")
+    source = open("testdata/tinyBasicProgram.txt").read()
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        scanner = lex_desc.compile_to(path)
+        loaded = load_scanner(path)
+        expected = [(t.string, t.lexical_class, t.relevance)
+                    for t in scanner.scan(source)]
+        test = [(t.string, t.lexical_class, t.relevance)
+                for t in loaded.scan(source)] == expected
+        test &= len(expected) > 0
+
+        # Files from another format version are refused.
+        data = open(path, 'rb').read()
+        open(path, 'wb').write(data[:4] + '\xff' + data[5:])
+        try:
+            load_scanner(path)
+            test = False
+        except Exception:
+            pass
+
+        # So are empty and truncated files, and files with states or tags
+        # out of range, with the same error as other bad files.
+        states, width = struct.unpack_from('<II', data, 8)
+        tags = 28 + 4 * states * width
+        bad = [data[:size] for size in [len(data) - 1, 40, 20, 0]]
+        bad.append(data[:16] + struct.pack('<I', states) + data[20:])
+        bad.append(data[:28] + struct.pack('<i', states) + data[32:])
+        bad.append(data[:tags] + struct.pack('<i', 1000) + data[tags + 4:])
+        for contents in bad:
+            open(path, 'wb').write(contents)
+            try:
+                load_scanner(path)
+                test = False
+            except Exception as e:
+                test &= "not a compiled lexer" in str(e)
+    finally:
+        os.remove(path)
+
+    if test:
+        print "Compiled lexer file: Success!"
+    else:
+        print "Compiled lexer file: Failure!"
+
+
+def test_description_cache():
+    """ Tests caching built descriptions on disk, and evicting old entries
+        once the cache is full.
+    """
+    import os, shutil, tempfile
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        fresh = ConstructLexicalDescription("testdata/lexdesc1.txt")
+        ConstructLexicalDescription("testdata/lexdesc1.txt", cache_dir)
+        cached = ConstructLexicalDescription("testdata/lexdesc1.txt", cache_dir)
+        test = len(os.listdir(cache_dir)) == 1
+        test &= cached.scanner is not None
+        source = open("testdata/testfile1.txt").read()
+        test &= [str(t) for t in cached.scan(source)] == \
+                [str(t) for t in fresh.scan(source)]
+
+        dfa = ConstructAutomata("testdata/dfa1.txt", cache_dir)
+        test &= list(ConstructAutomata("testdata/dfa1.txt", cache_dir).accepts) \
+                == list(dfa.accepts)
+
+        # Once the cache is full, the least recently used entries go first.
+        for name in os.listdir(cache_dir):
+            os.utime(os.path.join(cache_dir, name), (0, 0))
+        ConstructLexicalDescription("testdata/lexdesc2.txt", cache_dir)
+        newest = [name for name in os.listdir(cache_dir)
+                  if os.path.getmtime(os.path.join(cache_dir, name)) > 0]
+        evict(cache_dir, os.path.getsize(os.path.join(cache_dir, newest[0])))
+        test &= os.listdir(cache_dir) == newest
+
+        # Results that can't be pickled are still returned, and leave no
+        # temporary file behind.
+        unpicklable = lambda: None
+        test &= description_cache.cached(cache_dir, 'function', 'x',
+                                         lambda: unpicklable) is unpicklable
+        test &= os.listdir(cache_dir) == newest
+    finally:
+        shutil.rmtree(cache_dir)
+
+    if test:
+        print "Description cache: Success!"
+    else:
+        print "Description cache: Failure!"
+
+
+def test_description_parsers():
+    """ Tests that the hand-written description parser builds the same
+        automata and lexical descriptions as the pyparsing grammar.
+    """
+    test = True
+    for name in ["dfa1.txt", "dfa2.txt", "dfa3.txt", "dfa4.txt", "nfa1.txt"]:
+        fast = ConstructAutomata("testdata/" + name)
+        slow = ConstructAutomata("testdata/" + name, parser='pyparsing')
+        test &= fast.start == slow.start
+        test &= list(fast.states) == list(slow.states)
+        test &= list(fast.accepts) == list(slow.accepts)
+        test &= [[t[0], list(t[1]), t[2]] for t in fast.transitions] == \
+                [[t[0], list(t[1]), t[2]] for t in slow.transitions]
+        test &= fast.alphabet == slow.alphabet
+
+    for name in ["lexdesc1.txt", "lexdesc2.txt", "lexdesc3.txt",
+                 "lexdesc4.txt", "tiny_basic_lex_desc.txt"]:
+        fast = ConstructLexicalDescription("testdata/" + name)
+        slow = ConstructLexicalDescription("testdata/" + name, parser='pyparsing')
+        test &= fast.name == slow.name
+        test &= list(fast.alphabet) == list(slow.alphabet)
+        test &= [str(c) for c in fast.classes] == [str(c) for c in slow.classes]
+
+    # Both parsers reject the same malformed input.
+    for build, contents in [
+            (buildAutomata, "dfa states a end; initial end; accept end;"),
+            (buildLexicalDescription,
+             "language x alphabet 'a end; class c is 'a relevant end;")]:
+        for parser in ['fast', 'pyparsing']:
+            try:
+                build(contents, parser)
+                test = False
+            except Exception:
+                pass
+
+    if test:
+        print "Description parsers: Success!"
+    else:
+        print "Description parsers: Failure!"
+
+
+def test_incremental_rescan():
+    """ Tests updating the tokens of an edited string against scanning the
+        edited string from scratch.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/tiny_basic_lex_desc.txt")
+    original = open("testdata/tinyBasicProgram.txt").read()
+
+    # Replace a number, insert a line, replace the last character, delete a
+    # character and insert whitespace, then delete everything. Small runs
+    # make the edits move whole TokenRuns as well as regroup Tokens, and
+    # Tokens from tokenize aren't in runs until the first edit.
+    edits = [(original.index("10"), 2, "12345"), (0, 0, "LET Y = 3\n"),
+             (len(original) - 1, 1, "END"), (3, 1, ""), (0, 0, "  ")]
+    test = True
+    run_size = TokenRun.SIZE
+    try:
+        for size, scan in [(run_size, lex_desc.scan), (3, lex_desc.scan),
+                           (3, lambda s: list(lex_desc.tokenize(s)))]:
+            TokenRun.SIZE = size
+            source = original
+            tokens = scan(source)
+            for offset, deleted, inserted in edits:
+                tokens, source = lex_desc.rescan(source, tokens, offset,
+                                                 deleted, inserted)
+                test &= [(t.string, t.lexical_class, t.offset, t.reach)
+                         for t in tokens] == \
+                        [(t.string, t.lexical_class, t.offset, t.reach)
+                         for t in lex_desc.scan(source)]
+
+            tokens, source = lex_desc.rescan(source, tokens, 0, len(source),
+                                             "")
+            test &= tokens == [] and source == ""
+    finally:
+        TokenRun.SIZE = run_size
+
+    if test:
+        print "Incremental rescan: Success!"
+    else:
+        print "Incremental rescan: Failure!"
+
+
+def test_scan_files():
+    """ Tests scanning several files in worker processes, including files
+        that can't be read or scanned.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/tiny_basic_lex_desc.txt")
+    paths = ["testdata/tinyBasicProgram.txt", "testdata/testfile1.txt",
+             "testdata/missing.txt", "testdata/tinyBasicProgram.txt"]
+
+    serial = lex_desc.scan_files(paths)
+    parallel = lex_desc.scan_files(paths, workers=2)
+
+    test = isinstance(parallel[1], ScanError) and parallel[1].offset == 0
+    test &= isinstance(parallel[2], IOError)
+    expected = [str(t) for t in lex_desc.scan(open(paths[0]).read())]
+    for result in [serial[0], serial[3], parallel[0], parallel[3]]:
+        test &= [str(t) for t in result] == expected
+
+    if test:
+        print "Scan files: Success!"
+    else:
+        print "Scan files: Failure!"
+
+
+def test_parallel_scan():
+    """ Tests scanning a string in speculatively scanned chunks against
+        scanning it sequentially, including chunks split mid-token.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/tiny_basic_lex_desc.txt")
+    source = open("testdata/tinyBasicProgram.txt").read() * 20
+
+    test = True
+    for text in [source, source.replace("\n", " ")]:
+        expected = [(t.string, t.lexical_class, t.offset, t.reach)
+                    for t in lex_desc.scan(text)]
+        for chunks in [2, 7, 50]:
+            tokens = lex_desc.scan_parallel(text, workers=2, chunks=chunks)
+            test &= [(t.string, t.lexical_class, t.offset, t.reach)
+                     for t in tokens] == expected
+
+    broken = source[:len(source) // 2] + "#" + source[len(source) // 2:]
+    try:
+        lex_desc.scan_parallel(broken, workers=2, chunks=5)
+        test = False
+    except ScanError as e:
+        test &= e.offset == len(source) // 2
+
+    if test:
+        print "Parallel scan: Success!"
+    else:
+        print "Parallel scan: Failure!"
+
+
+def test_token_stream():
+    """ Tests scanning into a columnar TokenStream against scanning into a
+        list of Tokens.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/lexdesc1.txt")
+    source = open("testdata/testfile1.txt").read()
+    expected = [(t.string, t.lexical_class, t.relevance, t.offset)
+                for t in lex_desc.scan(source)]
+
+    stream = lex_desc.scan_stream(source)
+    test = len(stream) == len(expected)
+    test &= [(t.string, t.lexical_class, t.relevance, t.offset)
+             for t in stream] == expected
+    test &= stream[1].string == expected[1][0] == stream.text(1)
+    test &= [t.string for t in stream[1:3]] == [e[0] for e in expected[1:3]]
+    test &= [(t.string, t.lexical_class) for t in
+             stream.with_relevance('relevant')] == \
+            [(e[0], e[1]) for e in expected if e[2] == 'relevant']
+    test &= 0 < len(stream.with_relevance('relevant')) < len(stream)
+
+    if test:
+        print "Token stream: Success!"
+    else:
+        print "Token stream: Failure!"
+
+
+def test_deep_regex_nfa():
+    """ Tests building NFAs from regex trees too deep to walk recursively, and
+        that separate builds number their states independently.
+    """
+    # (((a b) a) b) ... with 5000 concatenations, under a repetition.
+    regex = Sigma('a')
+    for i in range(5000):
+        regex = Concatenation(regex, Sigma('b' if i % 2 == 0 else 'a'))
+    nfa = convertRegexToNFA(Repetition(regex))
+
+    test = len(nfa.nodes) == 2 * 5001 + 2
+    test &= nfa_valid_string(nfa, "ab" * 2500 + "a" + "ab" * 2500 + "a")
+    test &= not nfa_valid_string(nfa, "ab" * 2500)
+    test &= sorted(convertRegexToNFA(Sigma('a')).nodes) == ['s0', 's1']
+
+    if test:
+        print "Deep regex NFA: Success!"
+    else:
+        print "Deep regex NFA: Failure!"
+
+
+def test_glushkov_construction():
+    """ Tests that position automata have no epsilon transitions and accept
+        the same strings, and classes, as Thompson NFAs.
+    """
+    lex_desc = ConstructLexicalDescription("testdata/tiny_basic_lex_desc.txt")
+    regexes = [c.regex for c in lex_desc.classes]
+
+    test = True
+    for regex in regexes:
+        nfa = convertRegexToNFA(regex, method='glushkov')
+        test &= all(EPSILON not in node.transitions
+                    for node in nfa.nodes.values())
+        test &= equivalent(nfa, convertRegexToNFA(regex))
+
+    glushkov = hopcroftMinimize(convertNfaToDfa(
+        convertRegexListToNFA(regexes, method='glushkov')))
+    thompson = hopcroftMinimize(convertNfaToDfa(
+        convertRegexListToNFA(regexes)))
+    test &= len(glushkov.nodes) == len(thompson.nodes)
+    for word in ["LET", "LE", "X", "10", "<=", "<>", "  \n", "GOTOX"]:
+        tags = []
+        for dfa in [glushkov, thompson]:
+            dense, state = DenseAutomata.fromAutomata(dfa), 0
+            for symbol in word:
+                if state != DenseAutomata.DEAD:
+                    state = dense.nextState(state, symbol)
+            if state != DenseAutomata.DEAD:
+                state = dense.tags[state]
+            tags.append(state)
+        test &= tags[0] == tags[1]
+
+    if test:
+        print "Glushkov construction: Success!"
+    else:
+        print "Glushkov construction: Failure!"
+
+
+def test_consume_at():
+    """ Tests matching the front of a string from an offset with consume_at,
+        and the consume wrapper around it.
+    """
+    a, b = Sigma('a'), Sigma('b')
+    cases = [(a, "xab", 1, 2), (a, "xab", 2, 2), (a, "", 0, 0),
+             (Repetition(a), "baaab", 1, 4),
+             (Concatenation(a, b), "xxabb", 2, 4),
+             (Alternative(b, Concatenation(a, b)), "ab", 0, 2),
+             (NilExpression([]), "abc", 1, 1),
+             (Empty([]), "abc", 0, None)]
+
+    test = True
+    for regex, text, pos, end in cases:
+        test &= regex.consume_at(text, pos) == end
+        test &= regex.compile().consume_at(text, pos) == end
+        if end is None:
+            test &= regex.consume(text[pos:]) == (None, text[pos:])
+        else:
+            test &= regex.consume(text[pos:]) == (text[pos:end], text[end:])
+
+    if test:
+        print "Consume at: Success!"
+    else:
+        print "Consume at: Failure!"
+
+
+def test_node_identity():
+    """ Tests that nodes from different automata stay distinct, and that a
+        node stays in a set when it is added to another automata.
+    """
+    first = Automata(["q0", "q1"], "q0", ["q1"])
+    second = Automata(["q0", "q1"], "q0", ["q1"])
+
+    test = first.nodes["q0"] != second.nodes["q0"]
+    test &= len(set(first.nodes.values()) | set(second.nodes.values())) == 4
+
+    node = first.nodes["q1"]
+    seen = set([node])
+    second.addNodes([node])
+    test &= node in seen
+
+    if test:
+        print "Node identity: Success!"
+    else:
+        print "Node identity: Failure!"
+
+
+def test_mutated_dfa():
+    """ Tests that validating against a DFA gives the right answers after the
+        DFA is changed.
+    """
+    dfa = ConstructAutomata("testdata/dfa1.txt")
+    test = not dfa_valid_string(dfa, "ab")
+    dfa.markAccepting("blah3")
+    test &= dfa_valid_string(dfa, "ab")
+    test &= not dfa_valid_string(dfa, "abbaa")
+
+    dfa.nodes["blah4"].addTransition("blah1", "a")
+    test &= dfa_valid_string(dfa, "abbaa")
+    dfa.nodes["blah3"].accept = False
+    dfa.accepts = [name for name in dfa.accepts if name != "blah3"]
+    test &= not dfa_valid_string(dfa, "ab")
+    dfa.start = "blah2"
+    test &= dfa_valid_string(dfa, "bb")
+
+    if test:
+        print "Mutated DFA: Success!"
+    else:
+        print "Mutated DFA: Failure!"
+
+
 if __name__ == "__main__":
     test_full_toolchain_1()
     test_full_toolchain_2()
+    test_compiled_scanner()
+    test_scan_error_position()
+    test_streaming_scanner()
+    test_compiled_regex()
+    test_dense_automata()
+    test_hopcroft_minimize()
+    test_equivalence()
+    test_lazy_dfa()
+    test_nfa_simulation()
+    test_batch_validation()
+    test_array_validation()
+    test_compiled_lexer_file()
+    test_description_cache()
+    test_description_parsers()
+    test_incremental_rescan()
+    test_scan_files()
+    test_parallel_scan()
+    test_token_stream()
+    test_deep_regex_nfa()
+    test_glushkov_construction()
+    test_consume_at()
+    test_node_identity()
+    test_mutated_dfa()
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
 
+from array import array
+from itertools import izip
 from automata import *
 from regex import *
+from regex_builder import RegexBuilder
+from glushkov_construction import convertRegexToPositionNFA, \
+    convertRegexListToPositionNFA
 
 '''General notes for Thompson's construction:
 
@@ -10,154 +15,172 @@ means that whe never nfas are combined that start/accept states are
 cleared and set to new, single states appropriate to the kind of
 combination.
 
-When combining nfas, instead of creating an all new automaton, the
-"left" automata will just inherit all of the "right" automata's states
-and the right automata will be discarded. The left automata then acts
-as the new combined nfa.
+When combining nfas, nothing is copied: every sub-automaton of a build
+lives in the same NfaBuilder, as a (start, accept) pair of state
+numbers, and combining them only adds states and edges. States are
+numbered from 0 within each build, so builds are independent of each
+other, and the Automata object is only created once the whole build
+is done.
 
 '''
 
 
 EPSILON = '\0'
-__next_node_id = 0
 
 
-def __nextName():
-    """Returns a unique state name (i.e.: s0, s1, etc.)."""
-    global __next_node_id
-    __next_node_id += 1
-    return 's' + str(__next_node_id)
-
-
-def constructCharacter(character):
-    """Constructs a character transition automaton.
-       :param str character: Transition character.
-       :rtype: Automata
-    """
-
-    # Create two states with transition between them.
-    s0, s1 = AutomataNode(__nextName()), AutomataNode(__nextName())
-    s0.addTransition(s1.name, character)
-
-    # Install the states into an nfa.
-    nfa = Automata()
-    nfa.addNodes([s0, s1])
-    nfa.start = s0.name
-    nfa.accepts = [s1.name]
-    nfa.alphabet.add(character)
-
-    return nfa
-
-
-def constructConcatenation(left, right):
-    """Constructs a concatenation automaton from two other automata.
-       :param Automata left: Left side automaton to concatenate.
-       :param Automata right: Right side automaton to concatenate.
+class NfaBuilder(RegexBuilder):
+    """Builds NFAs from regular expression trees with Thompson's construction.
+       States are allocated as consecutive integers, and edges are recorded in
+       flat parallel arrays, until toAutomata turns them into an Automata.
+       Each built tree is the (start, accept) pair of states of its
+       automaton."""
+
+    def __init__(self):
+        self.stateCount = 0
+        """The number of states allocated so far."""
+
+        self.edgeFrom = array('i')
+        self.edgeSymbol = []
+        self.edgeTo = array('i')
+        """The edges so far: edge i goes from state edgeFrom[i] to state
+           edgeTo[i] on edgeSymbol[i]."""
+
+        self.alphabet = set()
+        """The symbols of every expression built so far."""
+
+    def newState(self):
+        """Allocates a state, returning its number."""
+        self.stateCount += 1
+        return self.stateCount - 1
+
+    def addEdge(self, fromState, symbol, toState):
+        self.edgeFrom.append(fromState)
+        self.edgeSymbol.append(symbol)
+        self.edgeTo.append(toState)
+
+    def constructCharacter(self, character):
+        """Constructs a character transition automaton.
+           :param str character: Transition character.
+           :return: The (start, accept) states of the automaton.
+        """
+        s0, s1 = self.newState(), self.newState()
+        self.addEdge(s0, character, s1)
+        self.alphabet.add(character)
+        return s0, s1
+
+    def constructEpsilon(self):
+        """Constructs an automaton accepting only the empty string."""
+        s0, s1 = self.newState(), self.newState()
+        self.addEdge(s0, EPSILON, s1)
+        return s0, s1
+
+    def constructEmpty(self):
+        """Constructs an automaton accepting nothing at all."""
+        # Two states with no way to get from the start to the accept.
+        return self.newState(), self.newState()
+
+    def constructConcatenation(self, left, right):
+        """Constructs a concatenation automaton from two other automata, given
+           as (start, accept) pairs."""
+        # Add an epsilon transition from the accept state of left to the
+        # start state of the right.
+        self.addEdge(left[1], EPSILON, right[0])
+        return left[0], right[1]
+
+    def constructAlternative(self, left, right):
+        """Constructs an alternative automaton from two other automata, given
+           as (start, accept) pairs."""
+        newStart, newAccept = self.newState(), self.newState()
+
+        # Epsilon transitions from the new start state to the start states
+        # of the combined automata, and epsilon transitions from the
+        # combined automata accept states to the new accept state.
+        self.addEdge(newStart, EPSILON, left[0])
+        self.addEdge(newStart, EPSILON, right[0])
+        self.addEdge(left[1], EPSILON, newAccept)
+        self.addEdge(right[1], EPSILON, newAccept)
+
+        return newStart, newAccept
+
+    def constructRepetition(self, inner):
+        """Constructs a repetition automaton from another automaton, given as
+           a (start, accept) pair."""
+        newStart, newAccept = self.newState(), self.newState()
+
+        # Epsilon transitions from the new start to the original start and
+        # to the new accept.
+        self.addEdge(newStart, EPSILON, inner[0])
+        self.addEdge(newStart, EPSILON, newAccept)
+
+        # Epsilon transition from the original accept to the new accept
+        # and original start.
+        self.addEdge(inner[1], EPSILON, newAccept)
+        self.addEdge(inner[1], EPSILON, inner[0])
+
+        return newStart, newAccept
+
+    def toAutomata(self, start, accepts):
+        """Creates the Automata of everything built so far.
+
+           :param int start: The start state.
+           :param list[int] accepts: The accept states.
+           :rtype: Automata
+        """
+        edges = izip(self.edgeFrom, self.edgeSymbol, self.edgeTo)
+        return self.assemble(self.stateCount, edges, start,
+                             [(accept, None) for accept in accepts])
+
+
+def convertRegexToNFA(node, method='thompson'):
+    """Constructs an NFA from a regular expression tree with Thompson's
+       construction.
+
+       :param Production node: The regular expression tree.
+       :param str method: 'thompson', or 'glushkov' for the epsilon-free
+                          position automaton instead (see
+                          glushkov_construction).
        :rtype: Automata
     """
-
-    # Merge the right automata into the left.
-    left.addNodes(right.nodes.values())
-    left.alphabet |= right.alphabet
-
-    # Add an epsilon transition from the accept state of left to the
-    # start state of__ the right.
-    left.nodes[left.accepts[0]].addTransition(right.start, EPSILON)
-    left.accepts = right.accepts
-
-    return left
-
-
-def constructAlternative(left, right):
-    """Constructs an alternative automaton from two other automata.
-       :param Automata left: Left side automaton to alternate.
-       :param Automata right: Right side automaton to alternate.
+    if method == 'glushkov':
+        return convertRegexToPositionNFA(node)
+    elif method != 'thompson':
+        raise Exception("Unknown NFA construction method: " + str(method))
+
+    builder = NfaBuilder()
+    start, accept = builder.build(node)
+    return builder.toAutomata(start, [accept])
+
+
+def convertRegexListToNFA(nodes, method='thompson'):
+    """Constructs a single tagged NFA recognizing the union of several regular
+       expression trees. Each regex is built with Thompson's construction and
+       joined to a new start state by an epsilon transition. The accept state
+       of the i'th regex is tagged with i, so that a DFA built from this NFA
+       can tell which regex (i.e. lexical class) it accepted, preferring the
+       earliest regex in the list on ties.
+
+       :param list[Production] nodes: The regular expression trees, in priority
+                                      order.
+       :param str method: 'thompson', or 'glushkov' for a tagged union of
+                          position automata instead.
        :rtype: Automata
     """
-
-    # Merge the right automata into the left.
-    left.addNodes(right.nodes.values())
-    left.alphabet |= right.alphabet
-
-    # New start and accept states
-    newStart, newAccept = AutomataNode(__nextName()), AutomataNode(__nextName())
-    left.addNodes([newStart, newAccept])
-
-    # Epsilon transitions from the new start state to the start states
-    # of the combined automata, and epsilon transitions from the
-    # combined automata accept states to the new accept state.
-    newStart.addTransition(left.start, EPSILON)
-    newStart.addTransition(right.start, EPSILON)
-    left.nodes[left.accepts[0]].addTransition(newAccept.name, EPSILON)
-    left.nodes[right.accepts[0]].addTransition(newAccept.name, EPSILON)
-
-    # Set combined automaton start/accept states.
-    left.start = newStart.name
-    left.accepts = [newAccept.name]
-
-    return left
-
-
-def constructRepetition(left):
-    """Constructs an alternative automaton from two other automata.
-       :param Automata left: Left side automaton to alternate.
-       :rtype: Automata
-    """
-
-    # New start and accept states
-    newStart, newAccept = AutomataNode(__nextName()), AutomataNode(__nextName())
-    left.addNodes([newStart, newAccept])
-
-    # Epsilon transitions from the new start to the original start and
-    # to the new accept.
-    newStart.addTransition(left.start, EPSILON)
-    newStart.addTransition(newAccept.name, EPSILON)
-
-    # Epsilon transition from the original accept to the new accept
-    # and original start.
-    left.nodes[left.accepts[0]].addTransition(newAccept.name, EPSILON)
-    left.nodes[left.accepts[0]].addTransition(left.start, EPSILON)
-
-    # Set automaton's new start and accept states.
-    left.start = newStart.name
-    left.accepts = [newAccept.name]
-
-    return left
-
-
-def __buildNFA(node):
-    """Constructs an NFA from a supplied regular expression tree.
-
-       :param Production node: The current node of the regular expression
-                               tree being evaluated.
-       :rtype: Automata
-
-    """
-    if isinstance(node, Sigma):
-        return constructCharacter(node.sigma)
-    elif isinstance(node, Repetition):
-        expr = convertRegexToNFA(node.expr)
-        return constructRepetition(expr)
-    elif isinstance(node, Alternative):
-        left = convertRegexToNFA(node.left)
-        right = convertRegexToNFA(node.right)
-        return constructAlternative(left, right)
-    elif isinstance(node, Concatenation):
-        left = convertRegexToNFA(node.left)
-        right = convertRegexToNFA(node.right)
-        return constructConcatenation(left, right)
-    else:
-        pass
-
-
-def convertRegexToNFA(node):
-    nfa = __buildNFA(node)
-    accept = nfa.accepts[0]
-    nfa.nodes[accept].accept = True
-    nfa.states = nfa.nodes.keys()
-    for node in nfa.nodes.values():
-        for trans in node.transitions.keys():
-            for toState in node.transitions[trans]:
-                nfa.transitions.append([node.name, [trans], toState])
+    if method == 'glushkov':
+        return convertRegexListToPositionNFA(nodes)
+    elif method != 'thompson':
+        raise Exception("Unknown NFA construction method: " + str(method))
+
+    builder = NfaBuilder()
+    start = builder.newState()
+
+    accepts = []
+    for node in nodes:
+        subStart, subAccept = builder.build(node)
+        builder.addEdge(start, EPSILON, subStart)
+        accepts.append(subAccept)
+
+    nfa = builder.toAutomata(start, accepts)
+    for tag, accept in enumerate(accepts):
+        nfa.nodes[nfa.accepts[tag]].tag = tag
 
     return nfa